@@ -1,22 +1,60 @@
 import json
 import requests
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from datetime import datetime
 import jwt
 import logging
 import os
+import re
+import threading
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 REFRESH_TOKEN_URL = "https://admin-api.saldoapps.com/admin-api/v1/user/auth/refresh-token"
-TOKEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'tokens.json')
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+TOKEN_FILE = os.path.join(CACHE_DIR, 'tokens.json')
 
-def load_tokens() -> Dict:
-    """Load tokens from the token file"""
+# Every tenant (household) signs in to Saldo separately; the default tenant keeps TOKEN_FILE
+DEFAULT_TENANT = 'default'
+TENANT_ID = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+# Access tokens are refreshed this long before they expire
+REFRESH_MARGIN_SECONDS = 60
+# Seconds to wait for the auth endpoint to connect and to answer a refresh
+REFRESH_TIMEOUT = (5, 30)
+
+# Current access token of each tenant with its expiry, so that a request costs no file read or JWT decode
+_token_cache: Dict[str, Tuple[str, float]] = {}
+# One per tenant, held while its token is loaded or refreshed: concurrent callers wait for that one
+# refresh and reuse its result, without holding up the other tenants
+_token_locks: Dict[str, threading.Lock] = {}
+_token_locks_lock = threading.Lock()
+
+def _token_lock(tenant: str) -> threading.Lock:
+    """The lock serializing a tenant's token refreshes"""
+    with _token_locks_lock:
+        return _token_locks.setdefault(tenant, threading.Lock())
+
+def tenant_path(directory: str, filename: str, tenant: str = DEFAULT_TENANT) -> str:
+    """Path of a tenant's copy of a file: <directory>/tenants/<tenant>/<filename>"""
+    if tenant == DEFAULT_TENANT:
+        return os.path.join(directory, filename)
+    if not TENANT_ID.match(tenant):
+        raise ValueError(f"Invalid tenant: {tenant}")
+    return os.path.join(directory, 'tenants', tenant, filename)
+
+def token_file(tenant: str = DEFAULT_TENANT) -> str:
+    """Path of a tenant's token file: cache/tenants/<tenant>/tokens.json"""
+    return tenant_path(CACHE_DIR, 'tokens.json', tenant)
+
+def load_tokens(tenant: str = DEFAULT_TENANT) -> Dict:
+    """Load a tenant's tokens from its token file"""
+    path = token_file(tenant)
     try:
-        with open(TOKEN_FILE, 'r') as f:
+        with open(path, 'r') as f:
             data = json.load(f)
             
             # Handle token structure
@@ -24,25 +62,27 @@ def load_tokens() -> Dict:
                 if 'accessToken' in data['jwt'] and 'refreshToken' in data['jwt']:
                     return data['jwt']
             
-            logger.error(f"Invalid token structure in {TOKEN_FILE}")
-            raise ValueError(f"Invalid token structure in {TOKEN_FILE}")
+            logger.error(f"Invalid token structure in {path}")
+            raise ValueError(f"Invalid token structure in {path}")
             
     except FileNotFoundError:
-        logger.error(f"Token file {TOKEN_FILE} not found")
+        logger.error(f"Token file {path} not found")
         raise
     except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in {TOKEN_FILE}")
+        logger.error(f"Invalid JSON in {path}")
         raise
     except Exception as e:
         logger.error(f"Error loading tokens: {str(e)}")
         raise
 
-def save_tokens(response_data: Dict) -> None:
+def save_tokens(response_data: Dict, tenant: str = DEFAULT_TENANT) -> None:
     """
-    Save the complete response data to the token file
+    Save the complete response data to the tenant's token file
     Args:
         response_data: Complete response containing jwt and user data
+        tenant: Tenant the tokens belong to
     """
+    path = token_file(tenant)
     try:
         # Validate the response structure
         if not isinstance(response_data, dict):
@@ -60,31 +100,36 @@ def save_tokens(response_data: Dict) -> None:
             logger.error("Invalid token format")
             raise ValueError("Tokens must contain 'accessToken' and 'refreshToken'")
         
-        # Save the complete response
-        with open(TOKEN_FILE, 'w') as f:
+        # Save the complete response; readers see either the old file or the new one, never a partial write
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
             json.dump(response_data, f, indent=4)
+        os.replace(temporary, path)
+        _token_cache[tenant] = (tokens['accessToken'], token_expiry(tokens['accessToken']))
         logger.debug("Complete response saved successfully")
     except Exception as e:
         logger.error(f"Error saving response data: {str(e)}")
         raise
 
-def refresh_tokens() -> Dict[str, str]:
+def refresh_tokens(tenant: str = DEFAULT_TENANT) -> Dict[str, str]:
     """
-    Refresh the JWT tokens using the refresh token stored in tokens.json
+    Refresh a tenant's JWT tokens using the refresh token stored in its tokens.json
     Returns the complete response containing new tokens and user data
     """
     try:
-        current_tokens = load_tokens()
+        current_tokens = load_tokens(tenant)
         refresh_token = current_tokens.get('refreshToken')
         
         if not refresh_token:
             logger.error("No refresh token found")
             raise ValueError("No refresh token found")
         
-        logger.debug("Attempting to refresh tokens")
+        logger.debug(f"Attempting to refresh tokens of tenant {tenant}")
         response = requests.post(
             REFRESH_TOKEN_URL,
-            json={"refreshToken": refresh_token}
+            json={"refreshToken": refresh_token},
+            timeout=REFRESH_TIMEOUT
         )
         response.raise_for_status()
         
@@ -92,7 +137,7 @@ def refresh_tokens() -> Dict[str, str]:
         response_data = response.json()
         
         # Save complete response
-        save_tokens(response_data)
+        save_tokens(response_data, tenant)
         logger.debug("Tokens and user data refreshed successfully")
         
         # Return the jwt part for compatibility with other functions
@@ -101,46 +146,73 @@ def refresh_tokens() -> Dict[str, str]:
         logger.error(f"Error refreshing tokens: {str(e)}")
         raise
 
-def is_token_expired(token: str) -> bool:
-    """Check if a JWT token is expired"""
+def token_expiry(token: str) -> float:
+    """Expiry of a JWT token as a Unix timestamp; 0 if it can't be read"""
     try:
-        logger.debug("Checking token expiration")
         payload = jwt.decode(token, options={"verify_signature": False})
-        exp_timestamp = payload['exp']
-        is_expired = datetime.fromtimestamp(exp_timestamp) <= datetime.now()
-        logger.debug(f"Token expired: {is_expired}")
-        return is_expired
+        return float(payload['exp'])
     except Exception as e:
         logger.error(f"Error checking token expiration: {str(e)}")
-        return True
+        return 0
+
+def is_token_expired(token: str) -> bool:
+    """Check if a JWT token is expired"""
+    is_expired = datetime.fromtimestamp(token_expiry(token)) <= datetime.now()
+    logger.debug(f"Token expired: {is_expired}")
+    return is_expired
+
+def _cached_token(tenant: str) -> Optional[str]:
+    """The tenant's cached access token, unless it expires within REFRESH_MARGIN_SECONDS"""
+    cached = _token_cache.get(tenant)
+    if cached and cached[1] - REFRESH_MARGIN_SECONDS > time.time():
+        return cached[0]
+    return None
 
-def get_access_token() -> str:
+def get_access_token(tenant: str = DEFAULT_TENANT) -> str:
     """
-    Get the current access token, refreshing if necessary
+    Get a tenant's current access token, refreshing if necessary
+
+    The token is served from memory until it is about to expire. Then one
+    caller reloads the token file (another process may have refreshed it)
+    and refreshes the token if needed, while concurrent callers wait for
+    that result instead of refreshing too.
+
     Returns the access token string
     """
-    try:
-        logger.debug("Getting access token")
-        tokens = load_tokens()
-        access_token = tokens.get('accessToken')
-        
-        if not access_token:
-            logger.error("No access token found")
-            raise ValueError("No access token found")
-        
-        if is_token_expired(access_token):
-            logger.debug("Token expired, refreshing")
-            tokens = refresh_tokens()
-            access_token = tokens['accessToken']
-        
+    access_token = _cached_token(tenant)
+    if access_token:
         return access_token
-    except Exception as e:
-        logger.error(f"Error in get_access_token: {str(e)}")
-        raise
+
+    with _token_lock(tenant):
+        access_token = _cached_token(tenant)
+        if access_token:
+            return access_token
+        try:
+            logger.debug(f"Getting access token of tenant {tenant}")
+            tokens = load_tokens(tenant)
+            access_token = tokens.get('accessToken')
+
+            if not access_token:
+                logger.error("No access token found")
+                raise ValueError("No access token found")
+
+            expiry = token_expiry(access_token)
+            if expiry - REFRESH_MARGIN_SECONDS <= time.time():
+                logger.debug("Token expires soon, refreshing")
+                tokens = refresh_tokens(tenant)
+                access_token = tokens['accessToken']
+            else:
+                _token_cache[tenant] = (access_token, expiry)
+
+            return access_token
+        except Exception as e:
+            logger.error(f"Error in get_access_token: {str(e)}")
+            raise
 
 if __name__ == "__main__":
+    import sys
     try:
-        new_tokens = refresh_tokens()
+        new_tokens = refresh_tokens(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TENANT)
         print("Tokens refreshed successfully!")
     except Exception as e:
         print(f"Error refreshing tokens: {e}") 
\ No newline at end of file
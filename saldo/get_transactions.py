@@ -1,17 +1,20 @@
 import json
 import logging
 from datetime import datetime, date
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from dataclasses import asdict
 import os
 import sys
+import time
 
 # Add the parent directory to sys.path when running as script
 if __name__ == "__main__":
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from saldo.auth import CACHE_DIR, DEFAULT_TENANT, tenant_path
     from saldo.saldo_api import SaldoAPI
     from saldo.saldo_types import Transaction
 else:
+    from .auth import CACHE_DIR, DEFAULT_TENANT, tenant_path
     from .saldo_api import SaldoAPI
     from .saldo_types import Transaction
 
@@ -19,6 +22,101 @@ else:
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Raw API dumps, read from here by scripts/transform_transactions.py
+RAW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'raw')
+
+def raw_file(filename: str, tenant: str = DEFAULT_TENANT) -> str:
+    """Path of a tenant's raw transactions file: raw/tenants/<tenant>/<filename>"""
+    path = tenant_path(RAW_DIR, filename, tenant)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+# Transactions requested per page while syncing
+SYNC_PAGE_SIZE = 500
+# Paging goes this far past the newest transaction date already synced, to pick up
+# backdated entries and recent edits, which don't move a transaction up the DATE order
+SYNC_LOOKBACK_MS = 7 * 24 * 60 * 60 * 1000
+
+def sync_state_file(tenant: str = DEFAULT_TENANT) -> str:
+    """Path of a tenant's sync watermark: cache/tenants/<tenant>/sync_state.json"""
+    return tenant_path(CACHE_DIR, 'sync_state.json', tenant)
+
+def load_watermark(tenant: str = DEFAULT_TENANT) -> Optional[Dict[str, int]]:
+    """
+    Load the watermark of the tenant's last sync
+
+    Returns:
+        {"transactionDate": newest transaction date, "updatedTimestamp": newest change},
+        or None if the tenant was never synced
+    """
+    try:
+        with open(sync_state_file(tenant), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_watermark(watermark: Dict[str, int], tenant: str = DEFAULT_TENANT) -> None:
+    """Persist the sync watermark, replacing the previous one atomically"""
+    path = sync_state_file(tenant)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(watermark, f, indent=4)
+    os.replace(temporary, path)
+
+def changed_at(item: Dict) -> Optional[int]:
+    """When a raw transaction was last created or updated; None if the API didn't say"""
+    return item.get('updatedTimestamp') or item.get('createdTimestamp')
+
+def sync_transactions(api: SaldoAPI, watermark: Optional[Dict[str, int]] = None) -> Tuple[List[Dict], Dict[str, int]]:
+    """
+    Fetch the transactions that are new or changed since a watermark
+
+    Pages through the account newest first and stops at the first transaction
+    dated SYNC_LOOKBACK_MS before the newest transaction date already synced;
+    without a watermark every page is fetched, several at a time.
+
+    The watermark never moves past the current time: a scheduled, future-dated
+    transaction would otherwise hide every later edit and the transactions
+    dated before it.
+
+    Args:
+        api: Client of the tenant's Saldo account
+        watermark: Watermark of the previous sync (see load_watermark)
+
+    Returns:
+        (new or changed raw transactions, newest first; watermark after this sync)
+    """
+    now = int(time.time() * 1000)
+    # Clamped on load too, for watermarks saved before the clamp
+    synced_date = min(watermark['transactionDate'], now) if watermark else None
+    synced_change = min(watermark['updatedTimestamp'], now) if watermark else None
+    stop_date = synced_date - SYNC_LOOKBACK_MS if watermark else None
+    latest = ({'transactionDate': synced_date, 'updatedTimestamp': synced_change} if watermark
+              else {'transactionDate': 0, 'updatedTimestamp': 0})
+
+    changed = []
+    seen = 0
+    # A routine sync usually ends on the first page, so only a full one fetches pages ahead
+    items = api.iter_transactions(size=SYNC_PAGE_SIZE, sort_by="DATE", sort_dir="DESC",
+                                  concurrency=1 if watermark else None)
+    for item in items:
+        transaction_date = item.get('transactionDate', 0)
+        if stop_date is not None and transaction_date < stop_date:
+            break
+        seen += 1
+        changed_time = changed_at(item)
+        if (watermark is None or transaction_date > synced_date
+                or (changed_time is not None and changed_time > synced_change)):
+            changed.append(item)
+        latest['transactionDate'] = max(latest['transactionDate'], min(transaction_date, now))
+        if changed_time is not None:
+            latest['updatedTimestamp'] = max(latest['updatedTimestamp'], min(changed_time, now))
+    items.close()
+
+    logger.info(f"Synced {seen} transactions: {len(changed)} new or changed")
+    return changed, latest
+
 def parse_transaction(data: Dict) -> Transaction:
     """
     Parse raw transaction data into a Transaction object
@@ -42,7 +140,7 @@ def parse_transaction(data: Dict) -> Transaction:
             'updatedTimestamp': data.get('updatedTimestamp')
         }
         
-        logger.debug(f"Parsing transaction data: {json.dumps(transaction_data, indent=2)}")
+        logger.debug("Parsing transaction %s", transaction_data['id'])
         return Transaction(**transaction_data)
     except Exception as e:
         logger.error(f"Error parsing transaction: {str(e)}")
@@ -54,83 +152,90 @@ def parse_transaction(data: Dict) -> Transaction:
             id=data.get('id', '0')
         )
 
-def get_current_month_transactions() -> str:
+def get_current_month_transactions(tenant: str = DEFAULT_TENANT, full: bool = False) -> str:
     """
-    Fetch transactions for the current month and save them to files
-    
+    Sync the tenant's transactions and merge the new and changed ones into its raw files
+
+    Only what changed since the watermark of the previous sync is fetched
+    (see sync_transactions). The watermark advances once the files are written.
+
+    Args:
+        tenant: Tenant whose Saldo account to read
+        full: Ignore the watermark and fetch the whole history
+
     Returns:
-        str: Name of the main transactions file
+        str: Path of the main transactions file
     """
+    filename = raw_file("transactions.json", tenant)
     try:
         logger.debug("Initializing SaldoAPI")
-        api = SaldoAPI()
-        
-        logger.debug("Fetching transactions")
-        response = api.get_transactions(
-            page=0,
-            size=1000,
-            sort_by="DATE",
-            sort_dir="DESC"
-        )
-        
-        logger.debug(f"API Response: {json.dumps(response, indent=2)}")
-
-        # Check if response has items
-        if not response or 'items' not in response or not response['items']:
-            logger.warning("No transactions found in API response")
-            return save_empty_transactions()
+        with SaldoAPI(tenant) as api:
+            logger.debug("Fetching transactions")
+            items, watermark = sync_transactions(api, None if full else load_watermark(tenant))
 
         # Parse transactions into typed objects
         transactions: List[Transaction] = []
-        for item in response['items']:
+        for item in items:
             try:
                 transactions.append(parse_transaction(item))
             except Exception as e:
                 logger.error(f"Error processing transaction: {str(e)}")
                 continue
-        
-        if not transactions:
+
+        if not transactions and not os.path.exists(filename):
             logger.warning("No transactions were successfully parsed")
-            return save_empty_transactions()
+            return save_empty_transactions(tenant)
+
+        # Replace the stored copies of changed transactions, keeping the file newest first
+        merged = {} if full else {item['id']: item for item in load_transactions(filename)}
+        merged.update((t.id, asdict(t)) for t in transactions)
+        items = sorted(merged.values(), key=lambda item: item['transactionDate'], reverse=True)
 
-        # Convert back to dictionaries for JSON serialization
-        items = [asdict(t) for t in transactions]
-        
         # Save all transactions
-        filename = "transactions.json"
-        logger.debug(f"Saving {len(items)} transactions to {filename}")
+        logger.debug(f"Saving {len(items)} transactions ({len(transactions)} new or changed) to {filename}")
         with open(filename, 'w') as f:
             json.dump(items, f, indent=4)
-        
+
         # Save last 5 transactions
-        filename_last_5 = "transactions_last_5.json"
+        filename_last_5 = raw_file("transactions_last_5.json", tenant)
         logger.debug(f"Saving last {min(5, len(items))} transactions to {filename_last_5}")
         with open(filename_last_5, 'w') as f:
             json.dump(items[:5], f, indent=4)
 
+        save_watermark(watermark, tenant)
         return filename
     except Exception as e:
         logger.error(f"Error in get_current_month_transactions: {str(e)}")
-        return save_empty_transactions()
+        # Keep what earlier syncs saved; the watermark hasn't moved, so the next sync retries
+        return filename if os.path.exists(filename) else save_empty_transactions(tenant)
+
+def load_transactions(filename: str) -> List[Dict]:
+    """Load the raw transactions saved by earlier syncs"""
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
 
-def save_empty_transactions() -> str:
+def save_empty_transactions(tenant: str = DEFAULT_TENANT) -> str:
     """Save empty transaction lists when no data is available"""
     empty_data = []
     
     # Save empty main file
-    filename = "transactions.json"
+    filename = raw_file("transactions.json", tenant)
     with open(filename, 'w') as f:
         json.dump(empty_data, f)
     
     # Save empty recent file
-    with open("transactions_last_5.json", 'w') as f:
+    with open(raw_file("transactions_last_5.json", tenant), 'w') as f:
         json.dump(empty_data, f)
     
     return filename
 
 if __name__ == "__main__":
     try:
-        output_file = get_current_month_transactions()
+        args = [arg for arg in sys.argv[1:] if arg != '--full']
+        output_file = get_current_month_transactions(*args[:1], full='--full' in sys.argv[1:])
         print(f"Transactions saved to {output_file}")
     except Exception as e:
         print(f"Error fetching transactions: {str(e)}")
@@ -1,34 +1,123 @@
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import json
-from typing import Dict
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
 import os
 import sys
 
 # Add the parent directory to sys.path when running as script
 if __name__ == "__main__":
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from saldo.auth import get_access_token
+    from saldo.auth import get_access_token, DEFAULT_TENANT
 else:
-    from .auth import get_access_token
+    from .auth import get_access_token, DEFAULT_TENANT
 
 logger = logging.getLogger(__name__)
 
+# Saldo account ID of every tenant: {"<tenant>": {"accountId": "..."}}
+TENANTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tenants.json')
+
+# Pages fetched at once by SaldoAPI.iter_transactions
+DEFAULT_CONCURRENCY = 4
+# Throttled (429) and failed (5xx) requests are retried with exponential backoff
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Only these may be replayed after a failure: a failed POST or PUT may already have been applied
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD'})
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.5
+
+def load_account_id(tenant: str) -> str:
+    """
+    Look up a tenant's Saldo account ID in TENANTS_FILE
+
+    The default tenant falls back to SaldoAPI.ACCOUNT_ID when it isn't listed.
+    """
+    try:
+        with open(TENANTS_FILE, 'r') as f:
+            account_id = json.load(f).get(tenant, {}).get('accountId')
+    except FileNotFoundError:
+        account_id = None
+    if account_id:
+        return str(account_id)
+    if tenant == DEFAULT_TENANT:
+        return SaldoAPI.ACCOUNT_ID
+    raise ValueError(f"No account ID configured for tenant {tenant} in {TENANTS_FILE}")
+
 class SaldoAPI:
     BASE_URL = "https://api.saldoapps.com/v6"
-    ACCOUNT_ID = "381497"  # Your account ID
-
-    @staticmethod
-    def _get_headers() -> Dict[str, str]:
-        """Get headers with current access token"""
-        token = get_access_token()
-        logger.debug(f"Using token: {token[:50]}...")  # Log only part of the token for security
-        headers = {
+    ACCOUNT_ID = "381497"  # Account ID of the default tenant
+
+    def __init__(self, tenant: str = DEFAULT_TENANT, account_id: Optional[str] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY):
+        """
+        Args:
+            tenant: Tenant whose tokens authenticate the requests
+            account_id: Saldo account ID; looked up in TENANTS_FILE when not given
+            concurrency: Pages iter_transactions fetches at once
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.tenant = tenant
+        self.account_id = account_id or load_account_id(tenant)
+        self.concurrency = concurrency
+        # One keep-alive connection per concurrent page fetch, reused across requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('https://', adapter)
+
+    def close(self) -> None:
+        """Close the pooled connections"""
+        self.session.close()
+
+    def __enter__(self) -> 'SaldoAPI':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_headers(self) -> Dict[str, str]:
+        """Get headers with the tenant's current access token"""
+        token = get_access_token(self.tenant)
+        logger.debug("Using token: %s...", token[:50])  # Log only part of the token for security
+        return {
             "Token": token,
             "Content-Type": "application/json"
         }
-        logger.debug(f"Headers: {json.dumps(headers, indent=2)}")
-        return headers
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request on the pooled session, retrying throttled and failed ones
+
+        Idempotent methods (IDEMPOTENT_METHODS) are retried on 429 and 5xx
+        responses, connection errors and timeouts; any other method only on
+        429 and on failures to connect, which the server never saw. Retries
+        stop after MAX_RETRIES, waiting as long as a Retry-After header asks
+        or else BACKOFF_SECONDS doubled per attempt, with jitter.
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_errors = ((requests.exceptions.ConnectionError, requests.exceptions.Timeout) if idempotent
+                        else requests.exceptions.ConnectTimeout)
+        retry_statuses = RETRY_STATUSES if idempotent else frozenset({429})
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.session.request(method, url, headers=self._get_headers(), **kwargs)
+            except retry_errors as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = BACKOFF_SECONDS * 2 ** attempt
+                logger.warning("%s %s failed (%s), retrying in %.1fs", method, url, e, delay)
+            else:
+                if response.status_code not in retry_statuses or attempt == MAX_RETRIES:
+                    return response
+                retry_after = response.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else BACKOFF_SECONDS * 2 ** attempt
+                logger.warning("%s %s returned %s, retrying in %.1fs", method, url, response.status_code, delay)
+            time.sleep(delay * random.uniform(1, 1.5))
 
     def get_transactions(self, page: int = 0, size: int = 50, sort_by: str = "DATE", sort_dir: str = "DESC") -> Dict:
         """
@@ -43,7 +132,7 @@ class SaldoAPI:
         Returns:
             Dict containing transactions data
         """
-        url = f"{self.BASE_URL}/{self.ACCOUNT_ID}/transactions"
+        url = f"{self.BASE_URL}/{self.account_id}/transactions"
         params = {
             "page": page,
             "size": size,
@@ -51,24 +140,19 @@ class SaldoAPI:
             "sort.dir": sort_dir
         }
         
-        logger.debug(f"Making request to {url}")
-        logger.debug(f"Request params: {json.dumps(params, indent=2)}")
+        logger.debug("Requesting page %s (size %s) from %s", page, size, url)
         
         try:
-            response = requests.get(
-                url=url,
-                headers=self._get_headers(),
-                params=params
-            )
-            logger.debug(f"Response status code: {response.status_code}")
-            logger.debug(f"Response headers: {json.dumps(dict(response.headers), indent=2)}")
+            response = self._request("GET", url, params=params)
             
             if response.status_code != 200:
                 logger.error(f"Error response: {response.text}")
                 response.raise_for_status()
             
             data = response.json()
-            logger.debug(f"Response data: {json.dumps(data, indent=2)}")
+            # Only a summary: formatting every page's body would cost more than fetching it
+            logger.debug("Page %s: status %s, %s items, %s bytes",
+                         page, response.status_code, len(data.get('items') or []), len(response.content))
             return data
         except requests.exceptions.RequestException as e:
             logger.error(f"API request failed: {str(e)}")
@@ -76,6 +160,41 @@ class SaldoAPI:
                 logger.error(f"Error response: {e.response.text}")
             raise
 
+    def iter_transactions(self, size: int = 500, sort_by: str = "DATE", sort_dir: str = "DESC",
+                          concurrency: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Iterate over the items of every transactions page, in page order
+
+        Up to `concurrency` pages are fetched at once, ahead of the page being
+        consumed; the first page shorter than `size` ends the iteration.
+        Pages fetched ahead are discarded when the iteration stops early.
+
+        Args:
+            size: Number of items per page
+            sort_by: Field to sort by (e.g., "DATE")
+            sort_dir: Sort direction ("ASC" or "DESC")
+            concurrency: Pages fetched at once (default: the client's concurrency)
+        """
+        concurrency = min(concurrency or self.concurrency, self.concurrency)
+
+        def fetch(page: int) -> list:
+            return self.get_transactions(page=page, size=size, sort_by=sort_by, sort_dir=sort_dir).get('items') or []
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='saldo-page') as executor:
+            pending = deque(executor.submit(fetch, page) for page in range(concurrency))
+            next_page = concurrency
+            try:
+                while pending:
+                    items = pending.popleft().result()
+                    yield from items
+                    if len(items) < size:
+                        break
+                    pending.append(executor.submit(fetch, next_page))
+                    next_page += 1
+            finally:
+                for future in pending:
+                    future.cancel()
+
     def make_request(self, method: str, endpoint: str, data: Dict = None) -> Dict:
         """
         Make a request to the Saldo API
@@ -86,12 +205,7 @@ class SaldoAPI:
             data: Request data for POST/PUT requests
         """
         url = f"{self.BASE_URL}/{endpoint.lstrip('/')}"
-        response = requests.request(
-            method=method,
-            url=url,
-            headers=self._get_headers(),
-            json=data
-        )
+        response = self._request(method, url, json=data)
         response.raise_for_status()
         return response.json()
 
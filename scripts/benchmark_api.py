@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+End-to-End API Load Benchmark for Saldo App
+
+This script loads synthetic transactions (see generate_transactions.py) into a
+scratch database, then drives the Flask app with concurrent clients and reports,
+per endpoint and range size, the p50/p95/p99 latency, throughput and the peak
+resident memory of the process while the scenario ran.
+
+Two transports are measured:
+    client    Flask test client, in process: the cost of the app itself
+    http      A threaded Werkzeug HTTP server on localhost: adds sockets and HTTP parsing
+
+Clients and server share this process, so the peak RSS covers both.
+
+Usage:
+    ./benchmark_api.py [--rows N] [--requests N] [--concurrency N] [--mode client|http|both]
+                       [--no-cache] [--db PATH]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import resource
+import threading
+import statistics
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from generate_transactions import generate, load
+
+RANGES = ['week', 'month', 'year', 'all']
+
+def date_range(name: str, end: datetime) -> str:
+    """Query string for a named range ending at end"""
+    if name == 'all':
+        return ''
+    days = {'week': 7, 'month': 30, 'year': 365}[name]
+    return f"start_date={(end - timedelta(days=days)):%Y-%m-%d}&end_date={end:%Y-%m-%d}"
+
+def scenarios(end: datetime) -> List[Tuple[str, str, str]]:
+    """(endpoint, range, URL) for every endpoint and range size"""
+    result = []
+    for range_name in RANGES:
+        dates = date_range(range_name, end)
+        join = '&' if dates else ''
+        result += [
+            ('transactions page', range_name, f"/api/transactions?{dates}{join}limit=100"),
+            ('transactions columnar', range_name, f"/api/transactions?{dates}{join}limit=100&format=columnar"),
+            ('summary', range_name, f"/api/summary?{dates}"),
+            ('search', range_name, f"/api/search?q=uklon&{dates}"),
+        ]
+        # Streaming the whole history is a bulk export, not a request to repeat hundreds of times
+        if range_name != 'all':
+            result.append(('transactions stream', range_name, f"/api/transactions?{dates}&stream=1"))
+    result.append(('recent', '-', '/api/transactions/recent'))
+    return result
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (peak so far where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+class PeakRss:
+    """Sample the process RSS in the background and keep the highest value seen"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+def test_client_fetcher(app) -> Callable[[str], int]:
+    """GET through a Flask test client per worker thread; returns the status code"""
+    local = threading.local()
+
+    def fetch(url: str) -> int:
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        response = local.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        response.get_data()
+        return response.status_code
+    return fetch
+
+def http_fetcher(port: int) -> Callable[[str], int]:
+    """GET over a keep-alive HTTP connection per worker thread; returns the status code"""
+    local = threading.local()
+
+    def fetch(url: str) -> int:
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local.connection.request('GET', url, headers={'Accept-Encoding': 'gzip'})
+        response = local.connection.getresponse()
+        response.read()
+        return response.status
+    return fetch
+
+def run(fetch: Callable[[str], int], url: str, requests: int, concurrency: int) -> Dict:
+    """Issue requests GETs of url from concurrency threads and summarize them"""
+    def timed(_):
+        started = time.perf_counter()
+        status = fetch(url)
+        return time.perf_counter() - started, status
+
+    with PeakRss() as rss, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(timed, range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for latency, _ in results]
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'p50': percentiles[49],
+        'p95': percentiles[94],
+        'p99': percentiles[98],
+        'rps': requests / elapsed,
+        'rss_mb': rss.peak / (1024 * 1024),
+        'errors': sum(1 for _, status in results if status != 200)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load-test the Saldo API on synthetic data',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('--rows', type=int, default=100000,
+                      help='Number of synthetic transactions to load (default: 100000)')
+    parser.add_argument('--years', type=float, default=5,
+                      help='Years of history the synthetic transactions span (default: 5)')
+    parser.add_argument('--requests', type=int, default=200,
+                      help='Requests per scenario (default: 200)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                      help='Concurrent clients (default: 8)')
+    parser.add_argument('--mode', choices=['client', 'http', 'both'], default='both',
+                      help='Transport to measure (default: both)')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Disable the query cache so every request reaches the database')
+    parser.add_argument('--db',
+                      help='Database file to use instead of a temporary one; loaded if empty')
+    args = parser.parse_args()
+
+    # Point the server at the scratch database before importing it
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='saldo-bench-'), 'benchmark.db')
+    os.environ['SALDO_DB_PATH'] = db_path
+    os.environ.setdefault('SALDO_LOG_LEVEL', 'WARNING')
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # One access log line per request otherwise
+    from server import database
+    from server.app import app
+
+    database.init_db()
+    if database.get_recent_transactions(1) == []:
+        print(f"Loading {args.rows:,} synthetic transactions into {db_path}")
+        started = time.perf_counter()
+        start, end = datetime.now() - timedelta(days=365 * args.years), datetime.now()
+        load(database, generate(args.rows, start, end, seed=0))
+        print(f"- Loaded in {time.perf_counter() - started:.1f}s")
+    if args.no_cache:
+        database.query_cache.max_bytes = 0
+
+    transports = []
+    if args.mode in ('client', 'both'):
+        transports.append(('client', test_client_fetcher(app), None))
+    if args.mode in ('http', 'both'):
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        transports.append(('http', http_fetcher(server.server_port), server))
+
+    end = datetime.now()
+    for transport, fetch, server in transports:
+        print(f"\n{transport}: {args.requests} requests per scenario, {args.concurrency} concurrent clients")
+        print(f"{'endpoint':<24} {'range':<6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>9} {'RSS MB':>8}")
+        for endpoint, range_name, url in scenarios(end):
+            fetch(url)  # Warm up connections, statement caches and, unless disabled, the query cache
+            result = run(fetch, url, args.requests, args.concurrency)
+            errors = f"  {result['errors']} errors" if result['errors'] else ''
+            print(f"{endpoint:<24} {range_name:<6} {result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f}"
+                  f" {result['rps']:>9.1f} {result['rss_mb']:>8.1f}{errors}")
+        if server is not None:
+            server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Query Plan Regression Benchmark for Saldo App
+
+This script loads a synthetic transactions table into a scratch database and checks
+every query built by server/database.py against it. A query fails when its
+EXPLAIN QUERY PLAN falls back to a full scan of the transactions table, sorts
+transaction rows through a temporary B-tree, stops using the index it is expected
+to use, or when its median run time exceeds the threshold.
+
+Usage:
+    ./benchmark_queries.py [--rows N] [--max-ms MS] [--repeat N] [--db PATH]
+
+Exits with status 1 if any check fails.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+from generate_transactions import ACCOUNTS, CATEGORIES, generate, load
+
+def day_range(first: datetime, last: datetime):
+    """Inclusive millisecond range covering local days first..last, as the API builds it"""
+    end = last.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return int(first.timestamp() * 1000), int(end.timestamp() * 1000)
+
+def build_checks(database, conn, end: datetime):
+    """
+    Every query shape issued by database.py, as (name, (sql, params), allow_sort, expected plan fragment)
+
+    allow_sort is only set for aggregates, where the temporary B-tree orders the
+    handful of grouped rows rather than the transactions themselves, and for the
+    ranked search, which sorts only the rows matching its words.
+    """
+    month_start = (end.replace(day=1) - timedelta(days=1)).replace(day=1)
+    month_end = end.replace(day=1) - timedelta(days=1)
+    month = day_range(month_start, month_end)
+    partial = day_range(month_start + timedelta(days=3), month_end - timedelta(days=3))
+    cursor = (month[1] - 86400000, 1 << 40)
+    page = lambda query: (query[0] + " LIMIT ?", query[1] + [101])
+    category_ids = database._dimension_ids(conn.cursor(), 'categories', CATEGORIES[0][0])
+    account_ids = database._dimension_ids(conn.cursor(), 'accounts', ACCOUNTS[0][0])
+
+    return [
+        ('page: all, newest first', page(database._transactions_query(None, None)), False, 'idx_transaction_date'),
+        ('page: month range', page(database._transactions_query(*month)), False, 'idx_transaction_date'),
+        ('page: month range after cursor', page(database._transactions_query(*month, cursor)), False, 'idx_transaction_date'),
+        ('page: category within range', page(database._transactions_query(*month, category_ids=category_ids)), False, 'idx_category_date'),
+        ('page: account within range', page(database._transactions_query(*month, account_ids=account_ids)), False, 'idx_account_date'),
+        ('summary: whole month (monthly rollups)', database._summary_query(*month, ['category', 'entry_type']), True, 'monthly_rollups'),
+        ('summary: partial month (daily rollups)', database._summary_query(*partial, ['category', 'entry_type']), True, 'daily_rollups'),
+        ('summary: by week (daily rollups)', database._summary_query(*month, ['week', 'account']), True, 'daily_rollups'),
+        ('summary: all time by month', database._summary_query(None, None, ['month', 'entry_type']), True, 'monthly_rollups'),
+        ('summary: unaligned range (raw rows)', database._summary_query(month[0] + 1, month[1], ['category', 'entry_type']), True, 'COVERING INDEX idx_date_summary'),
+        ('search: title words, ranked', page(database._search_query('netflix', None, None)), True, 'VIRTUAL TABLE INDEX'),
+    ]
+
+def check_plan(plan, allow_sort: bool, expected: str):
+    """Return the list of problems found in an EXPLAIN QUERY PLAN output"""
+    problems = []
+    details = [row['detail'] for row in plan]
+    if any(detail in ('SCAN transactions', 'SCAN t') for detail in details):
+        problems.append('full scan of transactions')
+    if not allow_sort and any('TEMP B-TREE' in detail for detail in details):
+        problems.append('temporary B-tree sort')
+    if not any(expected in detail for detail in details):
+        problems.append(f'expected plan to use {expected}')
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check query plans and timings of server/database.py on a synthetic table',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('--rows', type=int, default=200000,
+                      help='Number of synthetic transactions to load (default: 200000)')
+    parser.add_argument('--years', type=int, default=5,
+                      help='Years of history the synthetic transactions span (default: 5)')
+    parser.add_argument('--max-ms', type=float, default=50.0,
+                      help='Maximum median run time per query in milliseconds (default: 50)')
+    parser.add_argument('--repeat', type=int, default=20,
+                      help='Timed runs per query (default: 20)')
+    parser.add_argument('--db',
+                      help='Database file to use instead of a temporary one; loaded if empty')
+    args = parser.parse_args()
+
+    # Point database.py at the scratch database before importing it
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='saldo-bench-'), 'benchmark.db')
+    os.environ['SALDO_DB_PATH'] = db_path
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+    import logging
+    logging.disable(logging.INFO)
+    import database
+
+    database.init_db()
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    conn = database.get_db(db_path)
+    if conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 0:
+        print(f"Loading {args.rows:,} synthetic transactions into {db_path}")
+        started = time.perf_counter()
+        load(database, generate(args.rows, end - timedelta(days=365 * args.years), end))
+        print(f"- Loaded in {time.perf_counter() - started:.1f}s")
+    conn.execute('ANALYZE')
+
+    failures = 0
+    checks = build_checks(database, conn, end)
+    print(f"\n{'query':<42} {'median ms':>10}  result")
+    for name, (query, params), allow_sort, expected in checks:
+        plan = conn.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+        problems = check_plan(plan, allow_sort, expected)
+
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            conn.execute(query, params).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        median = statistics.median(timings)
+        if median > args.max_ms:
+            problems.append(f'median {median:.1f}ms over {args.max_ms:.0f}ms')
+
+        failures += bool(problems)
+        print(f"{name:<42} {median:>10.2f}  {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+        if problems:
+            for row in plan:
+                print(f"{'':<4}plan: {row['detail']}")
+
+    conn.close()
+    print(f"\n{failures} of {len(checks)} checks failed" if failures else "\nAll checks passed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
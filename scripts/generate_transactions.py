@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Synthetic Transaction Generator for Saldo App
+
+This script generates realistic Saldo-shaped transactions (in the transformed
+format read by populate_db.py) at any scale. Categories, accounts, merchants,
+entry types and amounts follow the proportions of a real export; timestamps are
+spread over several years, oldest first, the way a synced history is inserted.
+
+By default the transactions are loaded into the database through
+insert_transactions, exactly like populate_db.py does. With --output they are
+written to a JSON file instead.
+
+Usage:
+    ./generate_transactions.py [--rows N] [--years N] [--seed N] [--db PATH] [--clear]
+    ./generate_transactions.py --rows N --output FILE
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+# Master accounts and their share of transactions
+ACCOUNTS = [
+    ('Monobank UAH, White', 455),
+    ('Monobank UAH, Black', 87),
+    ('Binance USDT', 22),
+    ('Cash', 21),
+    ('Cash EUR', 5),
+    ('PayPal', 4),
+    ('Monobank USD, Black', 2),
+]
+
+# (name, type, icon, master entry type, share, median amount, merchants)
+CATEGORIES = [
+    ('Transport', 'EXPENSES', 'transport', 'CREDIT', 86, 198.0,
+     ['Uklon', 'Bolt', 'Київське метро', 'Київпастранс', 'OKKO', 'WOG']),
+    ('Eating out', 'EXPENSES', 'eating_out', 'CREDIT', 74, 422.0,
+     ['Osama Sushi', 'PITsERIIa KISS LIKE PIZZA', 'McDonald’s', 'Domino’s Pizza', 'Пузата Хата', 'Aroma Kava']),
+    ('Groceries', 'EXPENSES', 'groceries', 'CREDIT', 72, 217.5,
+     ['Novus', 'SILPO', 'Сільпо', 'АТБ', 'Fora', 'Metro Cash&Carry']),
+    ('Uncategorised income', 'INCOME', 'uncategorized', 'DEBIT', 44, 2014.4,
+     ['За реквізитами', 'Переказ з картки', 'Повернення коштів']),
+    ('Services', 'EXPENSES', 'phone', 'CREDIT', 35, 120.0,
+     ['Lifecell', 'Kyivstar', 'iPay.ua', 'OpenAI', 'Google One']),
+    ('Education', 'EXPENSES', 'education', 'CREDIT', 28, 4666.7,
+     ['Preply', 'Платіж WAYFORPAY', 'Платіж Laba', 'Coursera']),
+    ('Money on the way', 'MONEY_ON_THE_WAY', 'transfer', 'CREDIT', 20, 2750.0,
+     ['Переказ на картку', 'З чорної картки', 'З білої картки']),
+    ('Money on the way', 'MONEY_ON_THE_WAY', 'transfer', 'DEBIT', 20, 2750.0,
+     ['Переказ на картку', 'З чорної картки', 'З білої картки']),
+    ('Entertainment', 'EXPENSES', 'entertainment', 'CREDIT', 18, 310.5,
+     ['Steam', 'Netflix', 'Spotify', 'Multiplex', 'Planeta Kino']),
+    ('Uncategorised expense', 'EXPENSES', 'uncategorized', 'CREDIT', 14, 295.0,
+     ['Novapay', 'Apple', 'Нова пошта']),
+    ('Charity', 'EXPENSES', 'charity', 'CREDIT', 12, 495.7,
+     ['Patreon', 'Поповнення «На РЕБ»', 'Повернись живим', 'United24']),
+    ('Salary', 'INCOME', 'salary', 'DEBIT', 10, 38000.0,
+     ['Salary', 'Зарплата', 'Invoice payment']),
+    ('Health', 'EXPENSES', 'health', 'CREDIT', 9, 145.2,
+     ['APTEKA130', 'Аптека оптових цін', 'Добробут', 'Синево']),
+    ('Apps', 'EXPENSES', 'digital', 'CREDIT', 9, 427.2,
+     ['MIDJOURNEY INC.', 'LOOM SUBSCRIPTION', 'Adobe', 'GitHub']),
+    ('Self-care', 'EXPENSES', 'kids', 'CREDIT', 8, 275.2,
+     ['Bulgakov', 'MR.SCRUBBER', 'EVA']),
+    ('Other income', 'INCOME', 'other', 'DEBIT', 7, 170.0,
+     ['Cashback', 'Кешбек', 'Відсотки на залишок']),
+    ('Utility Bills', 'EXPENSES', 'bills', 'CREDIT', 6, 883.5,
+     ['EasyPay', 'Vodafone', 'Київводоканал', 'YASNO']),
+    ('Rent', 'EXPENSES', 'rent', 'CREDIT', 4, 15000.0,
+     ['Оренда', 'Rent']),
+    ('Clothing', 'EXPENSES', 'clothing', 'CREDIT', 5, 1500.0,
+     ['LIQPAY*O.TAJE', 'Zara', 'Intertop']),
+    ('Gifts', 'EXPENSES', 'gifts', 'CREDIT', 5, 593.0,
+     ['LIQPAY*Dicentra', 'LVIV CHOKOLATE WORKSHOP2', 'Yakaboo']),
+    ('Tech', 'EXPENSES', 'electronics', 'CREDIT', 3, 16838.5,
+     ['Foxtrot', 'Rozetka', 'Comfy']),
+    ('Pets', 'EXPENSES', 'pets', 'CREDIT', 2, 300.0,
+     ['MasterZoo', 'Zootovary']),
+]
+
+# Spread of amounts around each category's median (sigma of a log-normal)
+AMOUNT_SIGMA = 0.8
+
+def generate(count: int, start: datetime, end: datetime, seed=None) -> Iterator[Dict]:
+    """
+    Yield count transformed-format transactions between start and end, oldest first
+
+    Args:
+        count: Number of transactions
+        start: Earliest transaction time
+        end: Latest transaction time
+        seed: Random seed, for reproducible data sets
+    """
+    rng = random.Random(seed)
+    accounts = [name for name, _ in ACCOUNTS]
+    account_weights = [share for _, share in ACCOUNTS]
+    category_weights = [category[4] for category in CATEGORIES]
+
+    start_ms = int(start.timestamp() * 1000)
+    step = (end.timestamp() - start.timestamp()) * 1000 / max(count, 1)
+
+    for i in range(count):
+        name, category_type, icon, entry_type, _, median, merchants = rng.choices(CATEGORIES, category_weights)[0]
+        amount = round(median * math.exp(rng.gauss(0, AMOUNT_SIGMA)), 2)
+        yield {
+            'transactionDate': start_ms + int(step * i + rng.random() * step),
+            'title': rng.choice(merchants),
+            'journalList': [
+                {'master': True, 'entryType': entry_type, 'amount': amount,
+                 'account': {'name': rng.choices(accounts, account_weights)[0]}},
+                {'master': False, 'entryType': 'DEBIT' if entry_type == 'CREDIT' else 'CREDIT', 'amount': amount,
+                 'account': {'name': name, 'type': category_type, 'icon': icon}}
+            ]
+        }
+
+def load(database, transactions: Iterator[Dict], batch_size: int = 10000) -> int:
+    """Insert transactions in batches through database.insert_transactions; returns rows inserted"""
+    inserted = 0
+    batch: List[Dict] = []
+    for transaction in transactions:
+        batch.append(transaction)
+        if len(batch) == batch_size:
+            inserted += database.insert_transactions(batch)
+            batch = []
+    if batch:
+        inserted += database.insert_transactions(batch)
+    return inserted
+
+def write_json(transactions: Iterator[Dict], filename: str) -> int:
+    """Write transactions as a JSON array one at a time, so memory stays flat at any row count"""
+    count = 0
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for transaction in transactions:
+            f.write((',\n' if count else '\n') + json.dumps(transaction, ensure_ascii=False))
+            count += 1
+        f.write('\n]\n')
+    return count
+
+def history_range(years: float) -> tuple:
+    """(start, end) of a history ending now and spanning the given number of years"""
+    end = datetime.now()
+    return end - timedelta(days=365 * years), end
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate realistic synthetic transactions at configurable scale',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('--rows', type=int, default=100000,
+                      help='Number of transactions to generate (default: 100000)')
+    parser.add_argument('--years', type=float, default=5,
+                      help='Years of history the transactions span, ending now (default: 5)')
+    parser.add_argument('--seed', type=int,
+                      help='Random seed for a reproducible data set')
+    parser.add_argument('--db',
+                      help='Database file to load instead of the default one')
+    parser.add_argument('--clear', action='store_true',
+                      help='Clear existing data before loading')
+    parser.add_argument('--output',
+                      help='Write the transactions to this JSON file instead of loading them')
+    args = parser.parse_args()
+
+    transactions = generate(args.rows, *history_range(args.years), seed=args.seed)
+    started = time.perf_counter()
+
+    if args.output:
+        count = write_json(transactions, args.output)
+        print(f"Wrote {count:,} transactions to {args.output} in {time.perf_counter() - started:.1f}s")
+        return
+
+    if args.db:
+        os.environ['SALDO_DB_PATH'] = args.db
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+    import database
+
+    database.init_db()
+    if args.clear:
+        database.clear_transactions()
+    inserted = load(database, transactions)
+    print(f"Inserted {inserted:,} of {args.rows:,} transactions in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
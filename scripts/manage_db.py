@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Database Maintenance Script for Saldo App
+
+This script runs maintenance tasks against the SQLite database used by the server.
+
+Commands:
+    migrate            Apply pending schema migrations
+    rebuild-rollups    Recompute the daily/monthly rollup tables from the transactions table
+    archive            Move closed years out of the transactions table into per-year archive
+                       files (<database>.archive/<year>.db); queries still see them
+    tenant-key         Issue a new API key for a tenant, replacing its old one; clients send
+                       it in the X-Tenant-Key header (the default tenant needs none)
+
+Every command runs against the default tenant's database, one tenant's with
+--tenant, or all of them with --all-tenants.
+
+Usage:
+    ./manage_db.py [--tenant ID | --all-tenants] migrate
+    ./manage_db.py [--tenant ID | --all-tenants] rebuild-rollups
+    ./manage_db.py [--tenant ID | --all-tenants] archive [--before YEAR]
+    ./manage_db.py --tenant ID tenant-key
+"""
+
+import os
+import argparse
+import sys
+from datetime import datetime
+
+# Add server directory to Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'server'))
+
+from database import (
+    init_db, rebuild_rollups, archive_history, create_tenant_key, list_tenants, use_tenant, DEFAULT_TENANT,
+    SCHEMA_VERSION
+)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run maintenance tasks against the Saldo database',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    tenants = parser.add_mutually_exclusive_group()
+    tenants.add_argument('--tenant', default=DEFAULT_TENANT,
+                         help='Tenant whose database to maintain (default: %(default)s)')
+    tenants.add_argument('--all-tenants', action='store_true',
+                         help='Run the command against every tenant database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('migrate',
+                          help='Apply pending schema migrations')
+    subparsers.add_parser('rebuild-rollups',
+                          help='Recompute the rollup tables from the transactions table')
+    archive = subparsers.add_parser('archive',
+                                    help='Move closed years into per-year archive files')
+    archive.add_argument('--before', type=int, default=datetime.now().year - 1,
+                         help='Archive every year before this one (default: %(default)s, keeping last year hot)')
+    subparsers.add_parser('tenant-key',
+                          help='Issue a new API key for a tenant')
+    args = parser.parse_args()
+    if args.command == 'tenant-key' and (args.all_tenants or args.tenant == DEFAULT_TENANT):
+        parser.error('tenant-key needs --tenant with a tenant other than the default one')
+
+    for tenant in list_tenants() if args.all_tenants else [args.tenant]:
+        prefix = f"[{tenant}] " if args.all_tenants else ''
+        with use_tenant(tenant):
+            if args.command == 'migrate':
+                applied = init_db()
+                print(f"{prefix}Applied {applied} migration(s); schema at version {SCHEMA_VERSION}")
+
+            elif args.command == 'rebuild-rollups':
+                rebuild_rollups()
+                print(f"{prefix}Rollup tables rebuilt successfully")
+
+            elif args.command == 'archive':
+                moved = archive_history(args.before)
+                for year, count in moved.items():
+                    print(f"{prefix}Archived {count} transaction(s) of {year}")
+                if not moved:
+                    print(f"{prefix}Nothing to archive before {args.before}")
+
+            elif args.command == 'tenant-key':
+                print(f"Key for tenant {tenant} (shown once; the old key no longer works): {create_tenant_key(tenant)}")
+
+if __name__ == '__main__':
+    main()
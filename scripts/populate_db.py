@@ -4,33 +4,36 @@ Database Population Script for Saldo App
 
 This script reads transformed transaction files and populates the SQLite database.
 It can be used to initially populate the database or update it with new transactions.
+A tenant other than the default one is populated from saldo/transformed/tenants/<tenant>/.
+NDJSON files written by transform_transactions.py --stream are inserted in batches
+of BATCH_SIZE, so they are never held in memory whole.
 
 Usage:
-    ./populate_db.py [--clear]
+    ./populate_db.py [--clear] [--tenant ID]
 """
 
 import os
 import json
 import argparse
 import sys
+from itertools import islice
+from typing import Iterator
 
 # Add server directory to Python path
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'server'))
 
-from database import init_db, insert_transactions, get_db
+from database import init_db, insert_transactions, clear_transactions, use_tenant, current_tenant, DEFAULT_TENANT
 
 def clear_database():
-    """Clear all data from the transactions table"""
-    conn = get_db()
+    """Clear all data from the transactions table and its rollups"""
     try:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM transactions')
-        conn.commit()
+        clear_transactions()
         print("Database cleared successfully")
     except Exception as e:
         print(f"Error clearing database: {str(e)}")
-    finally:
-        conn.close()
+
+# Transactions inserted per batch from an NDJSON file
+BATCH_SIZE = 1000
 
 def load_transactions(filename: str) -> list:
     """Load transactions from a JSON file"""
@@ -41,30 +44,40 @@ def load_transactions(filename: str) -> list:
         print(f"Error loading transactions from {filename}: {str(e)}")
         return []
 
-def main():
-    parser = argparse.ArgumentParser(
-        description='Populate SQLite database with transformed transaction data',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog=__doc__
-    )
-    parser.add_argument('--clear', action='store_true',
-                      help='Clear existing data before populating')
-    args = parser.parse_args()
+def iter_transaction_batches(filename: str) -> Iterator[list]:
+    """Yield the transactions of an NDJSON file (one per line) in batches of BATCH_SIZE"""
+    with open(filename, 'r') as f:
+        transactions = (json.loads(line) for line in f if line.strip())
+        while True:
+            batch = list(islice(transactions, BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+def transformed_file(transformed_dir: str, name: str) -> str:
+    """The newer of a transformed file's NDJSON and JSON versions (the JSON path if neither exists)"""
+    candidates = [os.path.join(transformed_dir, name + extension) for extension in ('.ndjson', '.json')]
+    existing = [path for path in candidates if os.path.exists(path)]
+    return max(existing, key=os.path.getmtime) if existing else candidates[-1]
 
+def populate(clear: bool) -> None:
+    """Load the transformed transaction files into the current tenant's database"""
     # Initialize database
     init_db()
     
     # Clear database if requested
-    if args.clear:
+    if clear:
         clear_database()
 
     # Set up paths
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     transformed_dir = os.path.join(base_dir, 'saldo', 'transformed')
+    if current_tenant() != DEFAULT_TENANT:
+        transformed_dir = os.path.join(transformed_dir, 'tenants', current_tenant())
     
     # Load and insert all transactions
-    all_transactions = os.path.join(transformed_dir, 'transactions_transformed.json')
-    recent_transactions = os.path.join(transformed_dir, 'transactions_last_5_transformed.json')
+    all_transactions = transformed_file(transformed_dir, 'transactions_transformed')
+    recent_transactions = transformed_file(transformed_dir, 'transactions_last_5_transformed')
     
     files_to_process = [
         ('All Transactions', all_transactions),
@@ -73,7 +86,20 @@ def main():
     
     total_inserted = 0
     for description, filepath in files_to_process:
-        if os.path.exists(filepath):
+        if filepath.endswith('.ndjson'):
+            loaded = inserted = 0
+            try:
+                for batch in iter_transaction_batches(filepath):
+                    loaded += len(batch)
+                    inserted += insert_transactions(batch)
+            except Exception as e:
+                print(f"Error loading transactions from {filepath}: {str(e)}")
+            total_inserted += inserted
+            if loaded:
+                print(f"\nProcessed {description}:")
+                print(f"- Transactions loaded: {loaded}")
+                print(f"- Transactions inserted: {inserted}")
+        elif os.path.exists(filepath):
             transactions = load_transactions(filepath)
             if transactions:
                 inserted = insert_transactions(transactions)
@@ -86,5 +112,20 @@ def main():
     
     print(f"\nDatabase population complete: {total_inserted} total transactions inserted")
 
+def main():
+    parser = argparse.ArgumentParser(
+        description='Populate SQLite database with transformed transaction data',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('--clear', action='store_true',
+                      help='Clear existing data before populating')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT,
+                      help='Tenant whose database to populate; created if new (default: %(default)s)')
+    args = parser.parse_args()
+
+    with use_tenant(args.tenant):
+        populate(args.clear)
+
 if __name__ == '__main__':
     main() 
\ No newline at end of file
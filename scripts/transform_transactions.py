@@ -11,21 +11,190 @@ Directory Structure:
     ├── transformed/    # Minimized transaction files for the app
     └── cache/          # Cache files (tokens, temporary data)
 
+Tenants other than the default one keep their files under raw/tenants/<tenant>/
+and transformed/tenants/<tenant>/.
+
+With --stream, raw files are parsed one transaction at a time and the output is
+written as NDJSON (one transaction per line, *_transformed.ndjson), so memory use
+stays flat however large the input is.
+
+Raw files named on the command line (directories stand for every *.json file in
+them, and glob patterns are expanded) are transformed instead of the two files
+of the last sync, each into <name>_transformed.json or .ndjson. Files from
+different directories are told apart by their path below the directory they
+share: raw/tenants/acme/transactions.json next to raw/transactions.json becomes
+tenants-acme-transactions_transformed.ndjson. Files are spread over a pool of
+worker processes; with --stream, files larger than CHUNK_BYTES are also split
+into chunks transformed in parallel.
+
 Usage:
-    ./transform_transactions.py [--input-dir DIR] [--output-dir DIR]
+    ./transform_transactions.py [--base-dir DIR] [--tenant ID] [--stream] [--workers N] [RAW_FILE_OR_DIR ...]
 """
 
 import json
 import os
+import re
+import io
+import glob
+import shutil
 import argparse
-from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+# Same tenant rules as saldo/auth.py
+DEFAULT_TENANT = 'default'
+TENANT_ID = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+def tenant_dir(directory: str, tenant: str = DEFAULT_TENANT) -> str:
+    """Directory holding a tenant's files: <directory>/tenants/<tenant>"""
+    if tenant == DEFAULT_TENANT:
+        return directory
+    if not TENANT_ID.match(tenant):
+        raise ValueError(f"Invalid tenant: {tenant}")
+    return os.path.join(directory, 'tenants', tenant)
+
+# Characters read from a raw file at a time when streaming
+CHUNK_SIZE = 1 << 16
+WHITESPACE = re.compile(r'\s*')
+
+def iter_json_array(f: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """Yield the items of a JSON array one at a time, holding only a chunk of the file in memory"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    expected = '['  # then 'first', followed by ',' and 'item' in turn
+    while True:
+        pos = WHITESPACE.match(buffer, pos).end()
+        char = buffer[pos:pos + 1]
+        if char and expected == '[':
+            if char != '[':
+                raise ValueError("Expected a JSON array")
+            pos, expected = pos + 1, 'first'
+            continue
+        if char == ']' and expected in ('first', ','):
+            return
+        if char and expected == ',':
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+            pos, expected = pos + 1, 'item'
+            continue
+        if char:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A value not yet followed by ',' or ']' may continue in the next chunk (e.g. a number)
+                after = WHITESPACE.match(buffer, end).end()
+                if buffer[after:after + 1] in (',', ']') or eof:
+                    yield item
+                    pos, expected = end, ','
+                    continue
+        if eof:
+            raise ValueError("Unexpected end of JSON array")
+        chunk = f.read(chunk_size)
+        buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+
+# Raw files above this size are split into chunks of about this size when streaming
+CHUNK_BYTES = 16 << 20
+
+def _find_boundary(f, position: int, end: int, boundary: re.Pattern) -> Optional[int]:
+    """Offset of the first match of boundary between position and end, read in windows"""
+    overlap = 64
+    while position < end:
+        f.seek(position)
+        window = f.read(min(CHUNK_SIZE, end - position))
+        match = boundary.search(window)
+        if match:
+            return position + match.start()
+        position += max(len(window) - overlap, 1)
+    return None
+
+def chunk_ranges(path: str, chunk_bytes: int = CHUNK_BYTES) -> Optional[List[Tuple[int, int]]]:
+    """
+    Split a raw JSON array file into byte ranges of whole top-level items
+
+    Chunks are cut where a line indented exactly one level opens the next
+    item, which relies on the layout json.dump(..., indent=N) writes, as
+    saldo/get_transactions.py does: every nested value is indented deeper.
+
+    Returns:
+        Ranges of the items' text, without the enclosing brackets and the
+        commas between ranges; None if the file is small enough for one
+        piece or isn't laid out that way
+    """
+    size = os.path.getsize(path)
+    if size <= chunk_bytes:
+        return None
+
+    with open(path, 'rb') as f:
+        head = f.read(CHUNK_SIZE)
+        match = re.match(rb'\s*\[\n( +)[{\[]', head)
+        if not match:
+            return None
+        boundary = re.compile(rb',\n' + match.group(1) + rb'[{\[]')
+        f.seek(max(size - CHUNK_SIZE, 0))
+        tail = f.read()
+        end = size - len(tail) + tail.rfind(b']')
+
+        ranges = []
+        start = head.index(b'[') + 1
+        while True:
+            cut = _find_boundary(f, start + chunk_bytes, end, boundary) if start + chunk_bytes < end else None
+            if cut is None:
+                ranges.append((start, end))
+                return ranges
+            ranges.append((start, cut))
+            start = cut + 1
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """Raw files named by directories (every *.json in them) and glob patterns, in order and without duplicates"""
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(os.path.join(pattern, '*.json')) if os.path.isdir(pattern) else glob.glob(pattern)
+        for path in sorted(matches):
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def output_stems(paths: List[str]) -> List[str]:
+    """
+    Output names (without suffix) for raw files: their path below the directory they all share, joined by '-'
+
+    Raises:
+        ValueError: if two files would still get the same name
+    """
+    if not paths:
+        return []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    stems = [os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0].replace(os.sep, '-')
+             for path in paths]
+    for stem in set(stems):
+        clashing = [path for path, other in zip(paths, stems) if other == stem]
+        if len(clashing) > 1:
+            raise ValueError(f"Raw files would overwrite each other's output ({stem}): {', '.join(clashing)}")
+    return stems
+
+def print_stats(label: str, processed: int, original_size: int, new_size: int,
+                output_path: Optional[str] = None) -> None:
+    """Print the statistics of a transformed file, or the combined ones of several"""
+    reduction = (1 - new_size/original_size) * 100 if original_size else 0.0
+
+    print(f"\n{label}:")
+    print(f"- Transactions processed: {processed}")
+    print(f"- Original size: {original_size:,} bytes")
+    print(f"- New size: {new_size:,} bytes")
+    print(f"- Size reduction: {reduction:.1f}%")
+    if output_path:
+        print(f"- Output saved to: {output_path}")
 
 class TransactionTransformer:
-    def __init__(self, base_dir: str = 'saldo'):
-        """Initialize the transformer with base directory."""
+    def __init__(self, base_dir: str = 'saldo', tenant: str = DEFAULT_TENANT):
+        """Initialize the transformer with base directory and the tenant whose files to transform."""
         self.base_dir = base_dir
-        self.raw_dir = os.path.join(base_dir, 'raw')
-        self.transformed_dir = os.path.join(base_dir, 'transformed')
+        self.tenant = tenant
+        self.raw_dir = tenant_dir(os.path.join(base_dir, 'raw'), tenant)
+        self.transformed_dir = tenant_dir(os.path.join(base_dir, 'transformed'), tenant)
         
         # Ensure directories exist
         os.makedirs(self.raw_dir, exist_ok=True)
@@ -71,8 +240,8 @@ class TransactionTransformer:
             print(f"Error transforming transaction: {str(e)}")
             return None
 
-    def transform_file(self, input_filename: str, output_filename: str) -> bool:
-        """Transform a single transactions file."""
+    def transform_file(self, input_filename: str, output_filename: str, stream: bool = False) -> bool:
+        """Transform a single transactions file; with stream, one transaction at a time into NDJSON."""
         input_path = os.path.join(self.raw_dir, input_filename)
         output_path = os.path.join(self.transformed_dir, output_filename)
         
@@ -82,50 +251,162 @@ class TransactionTransformer:
                 print(f"Input file not found: {input_path}")
                 return False
 
-            # Read input file
-            with open(input_path, 'r') as f:
-                transactions = json.load(f)
-
-            # Transform transactions
-            transformed_transactions = []
-            for transaction in transactions:
-                transformed = self.transform_transaction(transaction)
-                if transformed:
-                    transformed_transactions.append(transformed)
-
-            # Write output file
-            with open(output_path, 'w') as f:
-                json.dump(transformed_transactions, f, indent=2)
-
-            # Print statistics
-            original_size = os.path.getsize(input_path)
-            new_size = os.path.getsize(output_path)
-            reduction = (1 - new_size/original_size) * 100
-            
-            print(f"\nTransformed {input_filename}:")
-            print(f"- Transactions processed: {len(transformed_transactions)}")
-            print(f"- Original size: {original_size:,} bytes")
-            print(f"- New size: {new_size:,} bytes")
-            print(f"- Size reduction: {reduction:.1f}%")
-            print(f"- Output saved to: {output_path}")
-            
+            processed = self.transform_path(input_path, output_path, stream)
+            print_stats(f"Transformed {input_filename}", processed,
+                        os.path.getsize(input_path), os.path.getsize(output_path), output_path)
             return True
 
         except Exception as e:
             print(f"Error processing file {input_filename}: {str(e)}")
             return False
 
-    def transform_all(self) -> None:
-        """Transform all transaction files."""
-        files_to_transform = [
-            ('transactions.json', 'transactions_transformed.json'),
-            ('transactions_last_5.json', 'transactions_last_5_transformed.json')
-        ]
-        
-        success_count = 0
-        for input_file, output_file in files_to_transform:
-            if self.transform_file(input_file, output_file):
-                success_count += 1
+    def transform_path(self, input_path: str, output_path: str, stream: bool = False) -> int:
+        """Transform a raw file into JSON, or NDJSON with stream; returns the count written."""
+        if stream:
+            return self.stream_file(input_path, output_path)
+
+        # Read input file
+        with open(input_path, 'r') as f:
+            transactions = json.load(f)
+
+        # Transform transactions
+        transformed_transactions = []
+        for transaction in transactions:
+            transformed = self.transform_transaction(transaction)
+            if transformed:
+                transformed_transactions.append(transformed)
+
+        # Write output file
+        with open(output_path, 'w') as f:
+            json.dump(transformed_transactions, f, indent=2)
+        return len(transformed_transactions)
+
+    def stream_file(self, input_path: str, output_path: str) -> int:
+        """Transform a raw JSON array file into NDJSON one transaction at a time; returns the count written."""
+        with open(input_path, 'r') as source:
+            return self._write_ndjson(iter_json_array(source), output_path)
+
+    def transform_chunk(self, input_path: str, start: int, end: int, output_path: str) -> int:
+        """Transform one byte range from chunk_ranges into NDJSON; returns the count written."""
+        with open(input_path, 'rb') as f:
+            f.seek(start)
+            text = f.read(end - start).decode('utf-8')
+        return self._write_ndjson(iter_json_array(io.StringIO(f'[{text}]')), output_path)
+
+    def _write_ndjson(self, transactions: Iterator[Dict], output_path: str) -> int:
+        processed = 0
+        with open(output_path, 'w') as target:
+            for transaction in transactions:
+                transformed = self.transform_transaction(transaction)
+                if transformed:
+                    target.write(json.dumps(transformed, separators=(',', ':')) + '\n')
+                    processed += 1
+        return processed
+
+    def transform_files(self, files: List[Tuple[str, str]], stream: bool = False,
+                        workers: Optional[int] = None) -> int:
+        """
+        Transform raw files on a pool of worker processes and print their statistics
+
+        With stream, large files are split by chunk_ranges and their chunks'
+        NDJSON concatenated in order. A single piece of work, or workers=1,
+        runs in this process.
+
+        Args:
+            files: (raw file path, output file path) pairs
+            workers: Worker processes (default: one per CPU)
+
+        Returns:
+            Number of files transformed successfully
+
+        Raises:
+            ValueError: if two files share an output path; nothing is transformed then
+        """
+        outputs = [os.path.abspath(output_path) for _, output_path in files]
+        if len(set(outputs)) < len(outputs):
+            raise ValueError("Several raw files share an output file")
+
+        # (file index, method, arguments, chunk output or None) of every piece of work
+        tasks = []
+        for index, (input_path, output_path) in enumerate(files):
+            if not os.path.exists(input_path):
+                print(f"Input file not found: {input_path}")
+                continue
+            ranges = chunk_ranges(input_path) if stream else None
+            if ranges is None:
+                tasks.append((index, self.transform_path, (input_path, output_path, stream), None))
+            else:
+                for number, (start, end) in enumerate(ranges):
+                    part = f"{output_path}.part{number}"
+                    tasks.append((index, self.transform_chunk, (input_path, start, end, part), part))
+
+        if len(tasks) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(method, *args) for _, method, args, _ in tasks]
+                outcomes = [(future.exception() or future.result()) for future in futures]
+        else:
+            outcomes = []
+            for _, method, args, _ in tasks:
+                try:
+                    outcomes.append(method(*args))
+                except Exception as e:
+                    outcomes.append(e)
+
+        success_count = total_processed = total_original = total_new = 0
+        for index, (input_path, output_path) in enumerate(files):
+            results = [(part, outcome) for (task_index, _, _, part), outcome in zip(tasks, outcomes) if task_index == index]
+            if not results:
+                continue
+            parts = [part for part, _ in results if part]
+            try:
+                errors = [outcome for _, outcome in results if isinstance(outcome, Exception)]
+                if errors:
+                    raise errors[0]
+                if parts:
+                    with open(output_path, 'wb') as target:
+                        for part in parts:
+                            with open(part, 'rb') as source:
+                                shutil.copyfileobj(source, target)
+            except Exception as e:
+                print(f"Error processing file {input_path}: {str(e)}")
+                continue
+            finally:
+                for part in parts:
+                    if os.path.exists(part):
+                        os.remove(part)
+
+            processed = sum(outcome for _, outcome in results)
+            original_size, new_size = os.path.getsize(input_path), os.path.getsize(output_path)
+            label = f"Transformed {os.path.basename(input_path)}" + (f" in {len(parts)} chunks" if parts else "")
+            print_stats(label, processed, original_size, new_size, output_path)
+            success_count += 1
+            total_processed += processed
+            total_original += original_size
+            total_new += new_size
+
+        if success_count > 1:
+            print_stats(f"Total of {success_count} files", total_processed, total_original, total_new)
+        return success_count
+
+    def transform_all(self, stream: bool = False, inputs: Optional[List[str]] = None,
+                      workers: Optional[int] = None) -> None:
+        """Transform all transaction files, or the raw files named by inputs (see expand_inputs)."""
+        extension = '.ndjson' if stream else '.json'
+        if inputs:
+            sources = expand_inputs(inputs)
+            files_to_transform = [
+                (path, os.path.join(self.transformed_dir, stem + '_transformed' + extension))
+                for path, stem in zip(sources, output_stems(sources))
+            ]
+        else:
+            files_to_transform = [
+                (os.path.join(self.raw_dir, 'transactions.json'),
+                 os.path.join(self.transformed_dir, 'transactions_transformed' + extension)),
+                (os.path.join(self.raw_dir, 'transactions_last_5.json'),
+                 os.path.join(self.transformed_dir, 'transactions_last_5_transformed' + extension))
+            ]
+
+        success_count = self.transform_files(files_to_transform, stream, workers)
         
         print(f"\nTransformation complete: {success_count}/{len(files_to_transform)} files processed successfully")
 
@@ -137,11 +418,22 @@ def main():
     )
     parser.add_argument('--base-dir', default='saldo',
                       help='Base directory containing raw/ and transformed/ subdirectories (default: saldo)')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT,
+                      help='Tenant whose files to transform (default: %(default)s)')
+    parser.add_argument('--stream', action='store_true',
+                      help='Parse raw files incrementally and write NDJSON output, in constant memory')
+    parser.add_argument('--workers', type=int,
+                      help='Worker processes (default: one per CPU)')
+    parser.add_argument('inputs', nargs='*', metavar='RAW_FILE_OR_DIR',
+                      help='Raw files, directories or glob patterns to transform instead of the last sync')
     args = parser.parse_args()
 
     # Create transformer and process files
-    transformer = TransactionTransformer(args.base_dir)
-    transformer.transform_all()
+    transformer = TransactionTransformer(args.base_dir, args.tenant)
+    try:
+        transformer.transform_all(args.stream, args.inputs, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
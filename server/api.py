@@ -0,0 +1,417 @@
+"""
+API request handlers shared by the Flask app (server/app.py) and the ASGI app (server/asgi.py)
+
+Handlers take an ApiRequest and return an ApiResponse, so neither of them depends
+on the framework serving them. Each server only adapts its own request and
+response objects.
+
+Data endpoints serve the tenant named by the tenant query parameter, or the
+default tenant without one. Any tenant but the default one also needs its key
+(see create_tenant_key) in the X-Tenant-Key header.
+"""
+
+import gzip
+import json
+import time
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import wraps
+from itertools import chain, islice
+from typing import Callable, Dict, Hashable, Iterable, Iterator, Optional, Tuple, Union
+
+from werkzeug.datastructures import Accept, ETags, Headers, MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from server import metrics
+from server.database import (
+    get_transactions_page, get_transactions_page_columnar, get_summary, iter_transactions,
+    search_transactions, get_change_version, query_cache, tenant_exists, use_tenant, check_tenant_key,
+    DEFAULT_TENANT
+)
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are optional
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always offered
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+# Page size bounds for /api/transactions
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Transactions serialized per chunk of a streamed response
+STREAM_CHUNK_SIZE = 500
+
+# Bodies smaller than this are sent as is; compressing them saves less than a round trip costs
+COMPRESS_MIN_SIZE = 1024
+
+# Content codings we can produce, most preferred first
+CONTENT_CODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+# Request headers that pick the representation of a negotiated response
+VARY = 'Accept, Accept-Encoding'
+
+@dataclass
+class ApiRequest:
+    """The parts of an HTTP request the API handlers read"""
+    args: MultiDict
+    headers: Headers
+
+    @property
+    def accept_mimetypes(self) -> MIMEAccept:
+        return parse_accept_header(self.headers.get('Accept'), MIMEAccept)
+
+    @property
+    def accept_encodings(self) -> Accept:
+        return parse_accept_header(self.headers.get('Accept-Encoding'), Accept)
+
+    @property
+    def if_none_match(self) -> ETags:
+        return parse_etags(self.headers.get('If-None-Match'))
+
+@dataclass
+class ApiResponse:
+    """
+    Response produced by an API handler
+
+    body is either the complete payload or an iterator of chunks to stream.
+    """
+    status: int
+    body: Union[bytes, Iterable[bytes]] = b''
+    mimetype: Optional[str] = JSON_MIMETYPE
+    headers: Dict[str, str] = field(default_factory=dict)
+
+def dumps(payload) -> str:
+    """Serialize a payload as compact JSON"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+def json_response(payload: Dict, status: int = 200) -> ApiResponse:
+    return ApiResponse(status, dumps(payload).encode('utf-8'))
+
+def error_response(message: str, status: int) -> ApiResponse:
+    return json_response({
+        'status': 'error',
+        'message': message
+    }, status)
+
+def negotiate_encoding(request: ApiRequest) -> Optional[str]:
+    """Pick the content coding for a response body, or None to send it uncompressed"""
+    return request.accept_encodings.best_match(CONTENT_CODINGS)
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a body with a coding returned by negotiate_encoding"""
+    if encoding == 'br':
+        return brotli.compress(body)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+def parse_date_timestamp(date_str: str) -> int:
+    """Convert date string to Unix timestamp in milliseconds"""
+    try:
+        if not date_str:
+            return 0
+        # Parse the date string to datetime at the start of the day (00:00:00)
+        dt = datetime.strptime(date_str, '%Y-%m-%d').replace(hour=0, minute=0, second=0, microsecond=0)
+        # Convert to milliseconds
+        ts = int(dt.timestamp() * 1000)
+        logger.debug("Converted date %s to timestamp %s", date_str, ts)
+        return ts
+    except Exception as e:
+        logger.error("Error parsing date %s: %s", date_str, e)
+        return 0
+
+def parse_date_range(args) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Read start_date/end_date query parameters into an inclusive timestamp range
+
+    Returns (None, None) unless both dates are given, meaning "no date filter"
+    """
+    start_date = args.get('start_date', '')
+    end_date = args.get('end_date', '')
+    logger.debug("Date range: %s to %s", start_date, end_date)
+
+    if not (start_date and end_date):
+        return None, None
+
+    # Convert dates to timestamps
+    start_ts = parse_date_timestamp(start_date)
+    end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
+    end_ts = int(end_dt.timestamp() * 1000)
+
+    logger.debug("Date range in timestamps: %s to %s", start_ts, end_ts)
+    return start_ts, end_ts
+
+def parse_page_size(args) -> int:
+    """Read the limit query parameter, clamped to MAX_PAGE_SIZE"""
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
+
+def parse_format(args) -> str:
+    """Read the format query parameter: 'json' (nested journalList rows) or 'columnar'"""
+    response_format = args.get('format', 'json')
+    if response_format not in ('json', 'columnar'):
+        raise ValueError(f"Unknown format: {response_format}")
+    return response_format
+
+def columnar_envelope(transactions: Dict, next_cursor: Optional[str] = None) -> Dict:
+    """Wrap a columnar page in the usual response envelope"""
+    return {
+        'status': 'success',
+        'format': 'columnar',
+        'data': transactions,
+        'next_cursor': next_cursor
+    }
+
+def cached_payload(request: ApiRequest, key: Hashable, build: Callable[[], Dict]) -> ApiResponse:
+    """
+    Serve a payload from the query cache, building and serializing it only on a miss
+
+    Clients that prefer MessagePack in their Accept header get it when msgpack
+    is installed; everyone else gets JSON. Bodies of COMPRESS_MIN_SIZE or more
+    are compressed as the Accept-Encoding header allows, and the compressed
+    bytes are cached next to the plain ones.
+    """
+    mimetype = JSON_MIMETYPE
+    if msgpack is not None and request.accept_mimetypes.best_match([mimetype, MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE:
+        mimetype = MSGPACK_MIMETYPE
+
+    def serialize() -> bytes:
+        if mimetype == MSGPACK_MIMETYPE:
+            return msgpack.packb(build())
+        return dumps(build()).encode('utf-8')
+
+    headers = {'Vary': VARY}
+    body = query_cache.get_or_set((key, mimetype), serialize)
+    encoding = negotiate_encoding(request)
+    if encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+        # Re-reads the plain body inside the build so both entries come from the same version
+        body = query_cache.get_or_set((key, mimetype, encoding),
+                                      lambda: compress(query_cache.get_or_set((key, mimetype), serialize), encoding))
+        headers['Content-Encoding'] = encoding
+    return ApiResponse(200, body, mimetype, headers)
+
+def stream_transactions(transactions: Iterator[Dict]) -> ApiResponse:
+    """
+    Stream the whole range as the usual {"status", "data"} envelope, chunk by chunk
+
+    Rows are serialized straight off the database cursor, so memory stays flat
+    however large the range is. The first row is fetched up front so that query
+    errors still produce a regular 500 response.
+    """
+    first = list(islice(transactions, 1))
+    rows = chain(first, transactions)
+
+    def generate() -> Iterator[bytes]:
+        yield b'{"status":"success","data":['
+        separator = ''
+        try:
+            while True:
+                batch = list(islice(rows, STREAM_CHUNK_SIZE))
+                if not batch:
+                    break
+                yield (separator + ','.join(dumps(transaction) for transaction in batch)).encode('utf-8')
+                separator = ','
+        except Exception as e:
+            # Headers are already sent; a truncated body is the only signal left
+            logger.error("Error streaming transactions: %s", e, exc_info=True)
+            return
+        finally:
+            transactions.close()
+        yield b']}'
+
+    return ApiResponse(200, generate())
+
+def endpoint(description: str):
+    """Turn ValueErrors into 400 responses and anything else into a logged 500"""
+    def decorator(handler: Callable[[ApiRequest], ApiResponse]) -> Callable[[ApiRequest], ApiResponse]:
+        @wraps(handler)
+        def wrapper(request: ApiRequest) -> ApiResponse:
+            try:
+                return handler(request)
+            except ValueError as e:
+                return error_response(str(e), 400)
+            except Exception as e:
+                logger.error("Error fetching %s: %s", description, e, exc_info=True)
+                return error_response(str(e), 500)
+        return wrapper
+    return decorator
+
+def tenant_scoped(handler: Callable[[ApiRequest], ApiResponse]) -> Callable[[ApiRequest], ApiResponse]:
+    """Run a handler against the database of the tenant named in the request"""
+    @wraps(handler)
+    def wrapper(request: ApiRequest) -> ApiResponse:
+        tenant = request.args.get('tenant') or DEFAULT_TENANT
+        # Reads never create a database; tenants are set up by loading data into them.
+        # A missing or wrong key looks the same as an unknown tenant, so names can't be probed.
+        if not tenant_exists(tenant) or not check_tenant_key(tenant, request.headers.get('X-Tenant-Key')):
+            return error_response(f"Unknown tenant: {tenant}", 404)
+        with use_tenant(tenant):
+            return handler(request)
+    return wrapper
+
+def conditional(handler: Callable[[ApiRequest], ApiResponse]) -> Callable[[ApiRequest], ApiResponse]:
+    """
+    Tag responses with the database change version and answer repeats with 304
+
+    The ETag is checked before the handler runs, so revalidating an unchanged
+    resource never touches the transactions table. A 304 carries the same Vary
+    and Cache-Control as the 200 it stands for, so caches keep the
+    representations negotiated by cached_payload apart.
+    """
+    @wraps(handler)
+    def wrapper(request: ApiRequest) -> ApiResponse:
+        etag = f"v{get_change_version()}"
+        if request.if_none_match.contains(etag):
+            response = ApiResponse(304, mimetype=None, headers={'Vary': VARY})
+        else:
+            response = handler(request)
+            if response.status != 200:
+                return response
+        response.headers['ETag'] = quote_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+@endpoint('transactions')
+@tenant_scoped
+@conditional
+def transactions(request: ApiRequest) -> ApiResponse:
+    logger.debug("Received request with params: %s", request.args)
+
+    start_ts, end_ts = parse_date_range(request.args)
+
+    if request.args.get('stream') == '1':
+        return stream_transactions(iter_transactions(start_ts, end_ts))
+
+    limit = parse_page_size(request.args)
+    after = request.args.get('after') or None
+    category = request.args.get('category') or None
+    account = request.args.get('account') or None
+    columnar = parse_format(request.args) == 'columnar'
+
+    def build() -> Dict:
+        # Get one page of transactions from database
+        page_args = dict(limit=limit, after=after, category=category, account=account)
+        if columnar:
+            transactions, next_cursor = get_transactions_page_columnar(start_ts, end_ts, **page_args)
+            return columnar_envelope(transactions, next_cursor)
+        transactions, next_cursor = get_transactions_page(start_ts, end_ts, **page_args)
+        logger.debug("Retrieved %s transactions, next cursor %s", len(transactions), next_cursor)
+        return {
+            'status': 'success',
+            'data': transactions,
+            'next_cursor': next_cursor
+        }
+
+    return cached_payload(request, ('transactions', start_ts, end_ts, limit, after, category, account, columnar), build)
+
+@endpoint('recent transactions')
+@tenant_scoped
+@conditional
+def recent_transactions(request: ApiRequest) -> ApiResponse:
+    columnar = parse_format(request.args) == 'columnar'
+
+    def build() -> Dict:
+        if columnar:
+            transactions, _ = get_transactions_page_columnar(limit=5)
+            return columnar_envelope(transactions)
+        transactions, _ = get_transactions_page(limit=5)
+        logger.debug("Retrieved %s recent transactions", len(transactions))
+        return {
+            'status': 'success',
+            'data': transactions
+        }
+
+    return cached_payload(request, ('recent', 5, columnar), build)
+
+@endpoint('summary')
+@tenant_scoped
+@conditional
+def summary(request: ApiRequest) -> ApiResponse:
+    start_ts, end_ts = parse_date_range(request.args)
+    group_by = [d.strip() for d in request.args.get('group_by', 'category,entry_type').split(',') if d.strip()]
+
+    def build() -> Dict:
+        summary = get_summary(start_ts, end_ts, group_by)
+        logger.debug("Retrieved %s summary rows grouped by %s", len(summary), group_by)
+        return {
+            'status': 'success',
+            'data': summary
+        }
+
+    return cached_payload(request, ('summary', start_ts, end_ts, tuple(group_by)), build)
+
+@endpoint('search results')
+@tenant_scoped
+@conditional
+def search(request: ApiRequest) -> ApiResponse:
+    text = request.args.get('q', '').strip()
+    if not text:
+        raise ValueError("q is required")
+    start_ts, end_ts = parse_date_range(request.args)
+    limit = parse_page_size(request.args)
+    after = request.args.get('after') or None
+    columnar = parse_format(request.args) == 'columnar'
+
+    def build() -> Dict:
+        transactions, next_cursor = search_transactions(text, start_ts, end_ts, limit, after, columnar)
+        if columnar:
+            return columnar_envelope(transactions, next_cursor)
+        return {
+            'status': 'success',
+            'data': transactions,
+            'next_cursor': next_cursor
+        }
+
+    return cached_payload(request, ('search', text, start_ts, end_ts, limit, after, columnar), build)
+
+def metrics_page(request: ApiRequest) -> ApiResponse:
+    return ApiResponse(200, metrics.render().encode('utf-8'), metrics.CONTENT_TYPE)
+
+def observed(route: str, handler: Callable[[ApiRequest], ApiResponse]) -> Callable[[ApiRequest], ApiResponse]:
+    """Record latency, status and body size of every response a handler produces"""
+    @wraps(handler)
+    def wrapper(request: ApiRequest) -> ApiResponse:
+        started = time.perf_counter()
+        response = handler(request)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route=route)
+        metrics.REQUESTS.inc(route=route, status=str(response.status))
+        if isinstance(response.body, bytes):
+            metrics.RESPONSE_BYTES.observe(len(response.body), route=route)
+        else:
+            response.body = counted(route, response.body)
+        return response
+    return wrapper
+
+def counted(route: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Pass a streamed body through, recording its size once it is complete"""
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        metrics.RESPONSE_BYTES.observe(size, route=route)
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+# URL path -> handler, registered by both the Flask and the ASGI app
+ROUTES = {path: observed(path, handler) for path, handler in {
+    '/api/transactions': transactions,
+    '/api/transactions/recent': recent_transactions,
+    '/api/summary': summary,
+    '/api/search': search,
+    '/metrics': metrics_page
+}.items()}
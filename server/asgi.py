@@ -0,0 +1,157 @@
+"""
+ASGI variant of the Saldo server
+
+Serves the same API routes (from server/api.py) and static files as the Flask
+app, but without tying up a worker per connection: the event loop holds idle and
+slow clients, while blocking database work runs on a bounded thread pool sized
+to the database connection pool. Chunks of streamed responses are pulled on a
+pool of their own (see stream_executor). CORS headers and OPTIONS preflights
+are answered as Flask-CORS does for the Flask app.
+
+Run with any ASGI server, e.g.:
+    uvicorn server.asgi:app --host 0.0.0.0 --port 5001
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import Headers, MultiDict
+
+from server.api import ROUTES, ApiRequest, ApiResponse, error_response
+from server.assets import assets, index
+from server.database import POOL_SIZE
+from server.profiling import with_profiling
+
+logger = logging.getLogger(__name__)
+
+routes = with_profiling(ROUTES)
+
+# Blocking handler calls in flight at once; more would only queue on the connection pool
+executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='saldo-db')
+# A streamed response holds its pooled connection between chunks. Pulling chunks on the handler
+# pool would deadlock once handlers waiting for a connection took every thread from the streams
+# that would release one; chunk pulls never wait for a connection, so they can't starve each other.
+stream_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='saldo-stream')
+
+# Flask-CORS defaults, as server/app.py uses them
+CORS_METHODS = 'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'
+ALLOWED_METHODS = 'OPTIONS, GET, HEAD'
+
+def to_api_request(scope: dict) -> ApiRequest:
+    """Build the shared ApiRequest from an ASGI HTTP scope"""
+    query = scope.get('query_string', b'').decode('latin-1')
+    return ApiRequest(
+        args=MultiDict(parse_qsl(query, keep_blank_values=True)),
+        headers=Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+    )
+
+def resolve(method: str, path: str, request: ApiRequest):
+    """Map a request to the blocking callable that produces its response"""
+    if method == 'OPTIONS':
+        if path in routes or path == '/' or path.startswith('/utils/'):
+            return lambda: ApiResponse(200, mimetype='text/html', headers={'Allow': ALLOWED_METHODS})
+        return lambda: error_response('Not found', 404)
+    if method not in ('GET', 'HEAD'):
+        return lambda: error_response('Method not allowed', 405)
+    if path in routes:
+        return lambda: routes[path](request)
+    if path == '/':
+        return lambda: index(request)
+    if path.startswith('/utils/'):
+        return lambda: assets.serve(request, path)
+    return lambda: error_response('Not found', 404)
+
+def cors_headers(headers: Headers, request: ApiRequest, method: str) -> None:
+    """Add the CORS headers Flask-CORS adds with its defaults: any origin, echoed back when sent"""
+    origin = request.headers.get('Origin')
+    if origin:
+        headers['Access-Control-Allow-Origin'] = origin
+        headers.setdefault('Vary', 'Origin')  # Flask-CORS leaves a Vary set by the handler alone
+    else:
+        headers.setdefault('Access-Control-Allow-Origin', '*')
+
+    if method == 'OPTIONS' and request.headers.get('Access-Control-Request-Method'):
+        requested = request.headers.get('Access-Control-Request-Headers', '')
+        names = sorted(name.strip() for name in requested.split(',') if name.strip())
+        if names:
+            headers['Access-Control-Allow-Headers'] = ', '.join(names)
+        headers['Access-Control-Allow-Methods'] = CORS_METHODS
+
+def response_headers(response: ApiResponse, length: Optional[int], request: ApiRequest,
+                     method: str) -> List[Tuple[bytes, bytes]]:
+    headers = Headers(response.headers)
+    if response.mimetype:
+        charset = '; charset=utf-8' if response.mimetype.startswith('text/') else ''
+        headers['Content-Type'] = response.mimetype + charset
+    if length is not None:
+        headers['Content-Length'] = str(length)
+    cors_headers(headers, request, method)
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+
+async def send_response(send, response: ApiResponse, request: ApiRequest, method: str) -> None:
+    """Send an ApiResponse, pulling streamed chunks from the stream executor one at a time"""
+    loop = asyncio.get_running_loop()
+    head = method == 'HEAD'
+
+    if isinstance(response.body, bytes):
+        await send({'type': 'http.response.start', 'status': response.status,
+                    'headers': response_headers(response, len(response.body), request, method)})
+        await send({'type': 'http.response.body', 'body': b'' if head else response.body})
+        return
+
+    chunks: Iterator[bytes] = iter(response.body)
+    pulling = None
+    try:
+        await send({'type': 'http.response.start', 'status': response.status,
+                    'headers': response_headers(response, None, request, method)})
+        while not head:
+            pulling = loop.run_in_executor(stream_executor, next, chunks, None)
+            # Shielded, so that cancelling the request (client gone) doesn't abandon a pull still running
+            chunk = await asyncio.shield(pulling)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        # Releases the pooled connection behind a streamed cursor, even if the client went away.
+        # The generator can't be closed while a pull is still executing it, so that one finishes first.
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            if pulling is not None and not pulling.done():
+                await asyncio.wait([pulling])
+            await loop.run_in_executor(stream_executor, close)
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            stream_executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send) -> None:
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    request = to_api_request(scope)
+    produce = resolve(scope['method'], scope['path'], request)
+    try:
+        response = await asyncio.get_running_loop().run_in_executor(executor, produce)
+    except Exception as e:
+        logger.error("Error handling %s: %s", scope['path'], e, exc_info=True)
+        response = error_response(str(e), 500)
+    await send_response(send, response, request, scope['method'])
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('server.asgi:app', host='0.0.0.0', port=5001)
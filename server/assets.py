@@ -0,0 +1,130 @@
+"""
+Static files for the Flask app (server/app.py) and the ASGI app (server/asgi.py)
+
+Every file under static/ and utils/ is read, hashed and compressed once at
+startup. Besides its plain URL, each file is served under a fingerprinted URL
+with the content hash in its name (e.g. /utils/emoji_mappings.1a2b3c4d5e6f.js),
+and the pages reference those URLs. A fingerprinted URL never changes content,
+so it is cached by browsers for a year without revalidation; plain URLs,
+including the page itself, are revalidated with their ETag.
+"""
+
+import os
+import hashlib
+import logging
+import mimetypes
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from werkzeug.http import quote_etag
+
+from server.api import (
+    CONTENT_CODINGS, ApiRequest, ApiResponse, compress, error_response, negotiate_encoding
+)
+
+logger = logging.getLogger(__name__)
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(SERVER_DIR, 'static')
+UTILS_DIR = os.path.join(SERVER_DIR, 'utils')
+
+# Hex digits of the content hash used in fingerprinted file names and ETags
+FINGERPRINT_LENGTH = 12
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+@dataclass
+class Asset:
+    """A static file held in memory, with its body in every content coding"""
+    mimetype: str
+    fingerprint: str
+    bodies: Dict[Optional[str], bytes]
+
+def guess_mimetype(path: str) -> str:
+    if path.endswith('.js'):
+        return 'text/javascript'
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+def fingerprinted_url(url: str, fingerprint: str) -> str:
+    """/utils/x.js -> /utils/x.<fingerprint>.js"""
+    base, extension = os.path.splitext(url)
+    return f"{base}.{fingerprint}{extension}"
+
+class StaticAssets:
+    """
+    In-memory static files keyed by URL
+
+    Args:
+        mounts: URL prefix -> directory whose files are served under it
+    """
+
+    def __init__(self, mounts: Dict[str, str]):
+        self._assets: Dict[str, Asset] = {}
+        self._fingerprinted: Dict[str, str] = {}
+        self._load(mounts)
+
+    def _load(self, mounts: Dict[str, str]) -> None:
+        files = {}
+        for prefix, directory in mounts.items():
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    path = os.path.join(root, name)
+                    url = prefix + os.path.relpath(path, directory).replace(os.sep, '/')
+                    with open(path, 'rb') as f:
+                        files[url] = f.read()
+
+        # Fingerprint the referenced files first, then point the pages at them
+        pages = {url: body for url, body in files.items() if url.endswith('.html')}
+        for url, body in files.items():
+            if url not in pages:
+                self._add(url, body)
+        for url, body in pages.items():
+            for plain, fingerprinted in self._fingerprinted.items():
+                body = body.replace(plain.encode('utf-8'), fingerprinted.encode('utf-8'))
+            self._add(url, body)
+        logger.info("Loaded %s static assets", len(self._assets))
+
+    def _add(self, url: str, body: bytes) -> None:
+        bodies = {None: body}
+        for encoding in CONTENT_CODINGS:
+            compressed = compress(body, encoding)
+            # Already-compressed formats (images, fonts) gain nothing
+            if len(compressed) < len(body):
+                bodies[encoding] = compressed
+        fingerprint = hashlib.sha256(body).hexdigest()[:FINGERPRINT_LENGTH]
+        self._assets[url] = Asset(guess_mimetype(url), fingerprint, bodies)
+        self._fingerprinted[url] = fingerprinted_url(url, fingerprint)
+
+    def url_for(self, url: str) -> str:
+        """Fingerprinted URL of a static file"""
+        return self._fingerprinted[url]
+
+    def serve(self, request: ApiRequest, url: str) -> ApiResponse:
+        """Respond with the static file at url, plain or fingerprinted"""
+        asset = self._assets.get(url)
+        cache_control = REVALIDATE
+        if asset is None:
+            base, extension = os.path.splitext(url)
+            plain_base, _, fingerprint = base.rpartition('.')
+            asset = self._assets.get(plain_base + extension)
+            # A stale fingerprint must not be cached forever under the new content
+            if asset is None or fingerprint != asset.fingerprint:
+                return error_response('Not found', 404)
+            cache_control = IMMUTABLE
+
+        headers = {'Cache-Control': cache_control, 'ETag': quote_etag(asset.fingerprint), 'Vary': 'Accept-Encoding'}
+        if request.if_none_match.contains(asset.fingerprint):
+            return ApiResponse(304, mimetype=None, headers=headers)
+
+        encoding = negotiate_encoding(request)
+        if encoding not in asset.bodies:
+            encoding = None
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        return ApiResponse(200, asset.bodies[encoding], asset.mimetype, headers)
+
+assets = StaticAssets({'/': STATIC_DIR, '/utils/': UTILS_DIR})
+
+def index(request: ApiRequest) -> ApiResponse:
+    return assets.serve(request, '/index.html')
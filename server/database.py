@@ -1,264 +1,1886 @@
 import sqlite3
 import os
+import re
+import json
+import hmac
+import hashlib
+import secrets
+import pathlib
 import logging
+import queue
+import time
+import atexit
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from collections import OrderedDict, defaultdict
+from typing import Callable, Hashable, Iterator, List, Dict, Optional, Tuple
+
+try:
+    from server import metrics
+except ImportError:  # Imported as a top-level module by the scripts in scripts/
+    import metrics
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('SALDO_LOG_LEVEL', 'INFO'))
 logger = logging.getLogger(__name__)
 
 # Database setup
 DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'saldo', 'db')
-os.makedirs(DB_DIR, exist_ok=True)
-DB_PATH = os.path.join(DB_DIR, 'transactions.db')
+DB_PATH = os.environ.get('SALDO_DB_PATH') or os.path.join(DB_DIR, 'transactions.db')
+
+# Every tenant (household) has its own database file; the default tenant keeps DB_PATH
+DEFAULT_TENANT = 'default'
+TENANT_DIR = os.environ.get('SALDO_TENANT_DIR') or os.path.join(DB_DIR, 'tenants')
+TENANT_ID = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+MAX_OPEN_TENANTS = int(os.environ.get('SALDO_MAX_OPEN_TENANTS', 16))  # Tenant databases kept open at once
+# SHA-256 hashes of the keys that open every tenant but the default one: {"<tenant>": "<hex digest>"}
+TENANT_KEYS_FILE = os.environ.get('SALDO_TENANT_KEYS_FILE') or os.path.join(DB_DIR, 'tenant_keys.json')
+
+# Connection tuning
+POOL_SIZE = 8                          # Max open connections per database file
+CACHED_STATEMENTS = 256                # Prepared statements kept per connection
+MMAP_SIZE = 256 * 1024 * 1024          # Bytes of the database file to memory-map
+CACHE_SIZE_KB = 64 * 1024              # Page cache per connection
+
+# Serialized query results kept in memory per process
+QUERY_CACHE_MB = 32
+
+# Answer reads from an in-memory copy of the database (see SnapshotManager)
+SNAPSHOT_MODE = os.environ.get('SALDO_SNAPSHOT') == '1'
+
+# strftime formats for the period dimensions of get_summary (local time, like the API dates)
+PERIOD_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+    'year': '%Y'
+}
+
+# Summary dimensions mapped to the column they group by; periods come from PERIOD_FORMATS
+SUMMARY_DIMENSIONS = {
+    'category': 'category_id',
+    'account': 'account_id',
+    'entry_type': 'entry_type',
+    **{period: 'period' for period in PERIOD_FORMATS}
+}
+
+# Entry types of the master journal entry, stored as their index in this tuple
+ENTRY_TYPES = ('DEBIT', 'CREDIT')
+ENTRY_TYPE_IDS = {name: index for index, name in enumerate(ENTRY_TYPES)}
+
+# Amounts are stored as integer minor units of 1e-8: crypto accounts carry satoshi-scale
+# amounts, which cents would truncate, and 8 decimals still leave room for 9e10 per row
+MINOR_UNITS = 100_000_000
+
+# Joins from transactions (as t) to its dimension tables, and the columns read back through them
+TRANSACTION_JOINS = ' JOIN accounts a ON a.id = t.account_id JOIN categories c ON c.id = t.category_id'
+TRANSACTION_COLUMNS = (
+    't.id, t.transaction_date, t.title, t.amount_minor, t.entry_type, a.name AS account_name, '
+    "c.name AS category_name, NULLIF(c.type, '') AS category_type, NULLIF(c.icon, '') AS category_icon"
+)
 
-def get_db():
-    """Get database connection with row factory"""
-    conn = sqlite3.connect(DB_PATH)
+# Rollup tables keyed by their period column; both share the same dimensions
+ROLLUP_TABLES = {
+    'daily_rollups': 'day',
+    'monthly_rollups': 'month'
+}
+
+# Closed years moved out of the hot transactions table (see archive_history) live in one
+# file per year, attached under this schema name only while a query reads or writes them
+ARCHIVE_SCHEMA = 'archive'
+# Snapshot connections use the memdb VFS, which an attached file would otherwise inherit
+ARCHIVE_VFS = 'win32' if os.name == 'nt' else 'unix'
+
+def get_db(path: str = DB_PATH) -> sqlite3.Connection:
+    """Open a tuned database connection with row factory"""
+    conn = sqlite3.connect(path, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+
+    # WAL lets readers proceed while populate_db writes; NORMAL sync is safe under WAL
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
     return conn
 
-def init_db():
-    """Initialize the database schema"""
-    conn = get_db()
+class ConnectionManager:
+    """
+    Bounded pool of tuned connections to one database file
+
+    Connections are handed out to one thread at a time and reused across
+    requests, so Flask worker threads skip the connect/teardown cost. Nothing
+    touches the disk until the first connection is needed; that one also
+    applies pending schema migrations.
+    """
+
+    def __init__(self, path: str, pool_size: int = POOL_SIZE):
+        self.path = path
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle = queue.LifoQueue()
+        self._open_count = 0
+        self._count_lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._closed = False
+
+        # Dedicated connection whose PRAGMA data_version moves whenever anyone else commits
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+        self._data_version = None
+        self._change_version = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a connection, opening one if none is idle; blocks when the pool is exhausted"""
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = self._open()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._count_lock:
+            self._open_count += 1
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        """Open a new connection, migrating the schema first if this is the first one"""
+        self.ensure_schema()
+        return get_db(self.path)
+
+    def ensure_schema(self) -> int:
+        """Create the database file if needed and apply pending migrations, once per process"""
+        with self._schema_lock:
+            if self._schema_ready:
+                return 0
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = get_db(self.path)
+            try:
+                applied = migrate(conn)
+            finally:
+                conn.close()
+            self._schema_ready = True
+            return applied
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a borrowed connection, discarding any uncommitted work"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+                with self._count_lock:
+                    self._open_count -= 1
+            else:
+                self._idle.put(conn)
+        except sqlite3.Error as e:
+            logger.warning("Dropping broken pooled connection: %s", e)
+            conn.close()
+            with self._count_lock:
+                self._open_count -= 1
+        finally:
+            self._slots.release()
+
+    def change_version(self) -> int:
+        """
+        Current value of the persistent change counter bumped by every write
+
+        The counter row is only re-read when PRAGMA data_version reports a commit
+        from another connection (in this or any other process), so the common
+        case costs no table access at all.
+        """
+        with self._watcher_lock:
+            if self._watcher is None:
+                self._watcher = self._open()
+            data_version = self._watcher.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                row = self._watcher.execute(
+                    "SELECT value FROM db_meta WHERE key = 'change_version'"
+                ).fetchone()
+                self._change_version = row['value'] if row else 0
+                self._data_version = data_version
+            return self._change_version
+
+    def close_all(self) -> None:
+        """Close every idle connection; borrowed ones are closed as they are released"""
+        self._closed = True
+        with self._watcher_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+                self._data_version = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+            with self._count_lock:
+                self._open_count -= 1
+
+    @property
+    def idle_connections(self) -> int:
+        return self._idle.qsize()
+
+    @property
+    def busy_connections(self) -> int:
+        """Connections currently borrowed by a thread"""
+        return self._open_count - self._idle.qsize()
+
+class QueryCache:
+    """
+    Bounded LRU cache of serialized query results, shared by all tenants
+
+    Entries are keyed by the tenant whose database the current call uses, and
+    tagged with the change version of that database they were built under. A
+    tenant's entries are dropped as soon as its version advances, i.e. exactly
+    when a write commits new rows; other tenants keep theirs.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key: Hashable, build: Callable[[], bytes]) -> bytes:
+        """Return the cached bytes for key, calling build() and caching its result on a miss"""
+        database = _database()
+        tenant, version = database.tenant, database.reader.change_version()
+        key = (tenant, key)
+        with self._lock:
+            if version != self._versions.get(tenant):
+                self._clear(tenant, version)
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = build()
+
+        with self._lock:
+            # Skip storing if a write landed while building, or the value alone exceeds the budget
+            if version == self._versions.get(tenant) and key not in self._entries and len(value) <= self.max_bytes:
+                self._entries[key] = value
+                self._size += len(value)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return value
+
+    @property
+    def size(self) -> int:
+        """Bytes currently held"""
+        return self._size
+
+    def _clear(self, tenant: str, version: int) -> None:
+        for key in [key for key in self._entries if key[0] == tenant]:
+            self._size -= len(self._entries.pop(key))
+        self._versions[tenant] = version
+
+class _SnapshotConnection(sqlite3.Connection):
+    """Connection to one in-memory snapshot, remembering which one"""
+    snapshot = None
+
+class _Snapshot:
+    """An in-memory copy of the database, alive for as long as its keeper connection is open"""
+
+    def __init__(self, name: str, keeper: sqlite3.Connection, version: int):
+        self.name = name
+        self.keeper = keeper
+        self.version = version
+        self.idle: List[sqlite3.Connection] = []
+        self.borrowed = 0
+        self.retired = False
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f'file:{self.name}?vfs=memdb', uri=True, check_same_thread=False,
+                               cached_statements=CACHED_STATEMENTS, factory=_SnapshotConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA query_only = ON')
+        conn.snapshot = self
+        return conn
+
+class SnapshotManager:
+    """
+    Read-only pool over an in-memory snapshot of the database file
+
+    For read-heavy serving (SALDO_SNAPSHOT=1): the file is copied into memory
+    and reads are answered from the copy, without disk
+    I/O or file locks. When the change version on disk moves past the snapshot's,
+    a fresh copy is built in the background and swapped in atomically. Requests
+    holding a connection to the old copy finish on it; it is freed when the last
+    one is released. Until the swap, change_version() keeps reporting the
+    snapshot's version, so ETags and the query cache always match the data served.
+
+    Writes still go to the file through the ConnectionManager.
+    """
+
+    _names = itertools.count(1)
+
+    def __init__(self, source: ConnectionManager, pool_size: int = POOL_SIZE):
+        self._source = source
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._current: Optional[_Snapshot] = None
+        self._refreshing = False
+        self._closed = False
+
+    def _build(self) -> _Snapshot:
+        """
+        Copy the database file into a new in-memory database
+
+        VACUUM INTO rather than the backup API: a backup keeps the WAL flag of the
+        file header, which the memdb VFS refuses to open. It also reads from one
+        consistent read transaction and leaves the copy compacted.
+        """
+        self._source.ensure_schema()
+        name = f"/saldo-snapshot-{next(self._names)}"
+        keeper = sqlite3.connect(f'file:{name}?vfs=memdb', uri=True, check_same_thread=False)
+        keeper.row_factory = sqlite3.Row
+        source = sqlite3.connect(f'{pathlib.Path(self._source.path).resolve().as_uri()}?mode=ro', uri=True)
+        try:
+            source.execute('VACUUM INTO ?', (f'file:{name}?vfs=memdb',))
+        finally:
+            source.close()
+        # Read from the copy itself, so the version always describes the data in it
+        row = keeper.execute("SELECT value FROM db_meta WHERE key = 'change_version'").fetchone()
+        return _Snapshot(name, keeper, row['value'] if row else 0)
+
+    def _snapshot(self) -> Optional[_Snapshot]:
+        """The snapshot being served, loaded on first use; None once closed"""
+        if self._current is None and not self._closed:
+            with self._build_lock:
+                if self._current is None and not self._closed:
+                    self._current = self._build()
+                    logger.info("Loaded snapshot at change version %s", self._current.version)
+        return self._current
+
+    def _refresh(self) -> None:
+        try:
+            with self._build_lock:
+                snapshot = self._build()
+            with self._lock:
+                if self._closed:
+                    snapshot.keeper.close()
+                    return
+                old, self._current = self._current, snapshot
+                old.retired = True
+                idle, old.idle = old.idle, []
+                free_old = old.borrowed == 0
+            for conn in idle:
+                conn.close()
+            if free_old:
+                old.keeper.close()
+            logger.info("Swapped in snapshot at change version %s", snapshot.version)
+        except Exception as e:
+            logger.error("Error refreshing snapshot: %s", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def change_version(self) -> int:
+        """Change version of the snapshot being served; starts a refresh if the file has moved on"""
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return self._source.change_version()
+        if self._source.change_version() != snapshot.version:
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(target=self._refresh, name='saldo-snapshot', daemon=True).start()
+        return snapshot.version
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a read-only connection to the current snapshot, or to the file once closed"""
+        self.change_version()
+        self._slots.acquire()
+        with self._lock:
+            snapshot = self._current
+            if snapshot is not None:
+                snapshot.borrowed += 1
+                conn = snapshot.idle.pop() if snapshot.idle else None
+        if snapshot is None:
+            # Closed while a request was still using it: finish that request on the file
+            self._slots.release()
+            return self._source.acquire()
+        if conn is None:
+            try:
+                conn = snapshot.connect()
+            except Exception:
+                self.release_slot(snapshot)
+                raise
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a borrowed connection, closing it if its snapshot has been replaced"""
+        snapshot = getattr(conn, 'snapshot', None)
+        if snapshot is None:
+            self._source.release(conn)
+            return
+        with self._lock:
+            if not snapshot.retired:
+                snapshot.idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        self.release_slot(snapshot)
+
+    def release_slot(self, snapshot: _Snapshot) -> None:
+        with self._lock:
+            snapshot.borrowed -= 1
+            free = snapshot.retired and snapshot.borrowed == 0
+        if free:
+            snapshot.keeper.close()
+        self._slots.release()
+
+    def close_all(self) -> None:
+        """Close the idle connections of the current snapshot, and the snapshot once none is borrowed"""
+        with self._lock:
+            self._closed = True
+            snapshot, self._current = self._current, None
+            if snapshot is None:
+                return
+            snapshot.retired = True
+            idle, snapshot.idle = snapshot.idle, []
+            free = snapshot.borrowed == 0
+        for conn in idle:
+            conn.close()
+        if free:
+            snapshot.keeper.close()
+
+class TenantDatabase:
+    """The connection pool of one tenant's database file, and the reader the read functions use"""
+
+    def __init__(self, tenant: str, path: str):
+        self.tenant = tenant
+        self.manager = ConnectionManager(path)
+        # Connections the read functions use: the file itself, or its in-memory snapshot
+        self.reader = SnapshotManager(self.manager) if SNAPSHOT_MODE else self.manager
+
+    def archive_path(self, year: int) -> str:
+        """Archive file holding the transactions of a closed year, next to the database file"""
+        return os.path.join(f"{os.path.splitext(self.manager.path)[0]}.archive", f"{year}.db")
+
+    def close(self) -> None:
+        if self.reader is not self.manager:
+            self.reader.close_all()
+        self.manager.close_all()
+
+class TenantPool:
+    """
+    Open tenant databases, at most max_open of them, least recently used closed first
+
+    Opening a tenant is cheap, but its pooled connections, page caches and, in
+    snapshot mode, its in-memory copy are not; keeping only the active tenants
+    open bounds them. A request still using an evicted tenant finishes
+    normally: its connections are closed as they are released.
+    """
+
+    def __init__(self, max_open: int = MAX_OPEN_TENANTS):
+        self.max_open = max_open
+        self._open: 'OrderedDict[str, TenantDatabase]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tenant: str) -> TenantDatabase:
+        """The open database of a tenant, opening it (and evicting another) if needed"""
+        evicted = []
+        with self._lock:
+            database = self._open.get(tenant)
+            if database is not None:
+                self._open.move_to_end(tenant)
+                return database
+            database = self._open[tenant] = TenantDatabase(tenant, tenant_db_path(tenant))
+            while len(self._open) > self.max_open:
+                evicted.append(self._open.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+            logger.info("Closed database of tenant %s", old.tenant)
+        return database
+
+    def databases(self) -> List[TenantDatabase]:
+        with self._lock:
+            return list(self._open.values())
+
+    def close_all(self) -> None:
+        with self._lock:
+            databases, self._open = list(self._open.values()), OrderedDict()
+        for database in databases:
+            database.close()
+
+def tenant_db_path(tenant: str) -> str:
+    """Database file of a tenant; raises ValueError for ids that aren't safe file names"""
+    if tenant == DEFAULT_TENANT:
+        return DB_PATH
+    if not TENANT_ID.match(tenant):
+        raise ValueError(f"Invalid tenant: {tenant}")
+    return os.path.join(TENANT_DIR, f"{tenant}.db")
+
+def tenant_exists(tenant: str) -> bool:
+    """Whether a tenant has a database yet; the default tenant always does"""
+    return tenant == DEFAULT_TENANT or os.path.exists(tenant_db_path(tenant))
+
+# (modification time, keys) of TENANT_KEYS_FILE as last read, so new keys apply without a restart
+_tenant_keys: Tuple[Optional[int], Dict[str, str]] = (None, {})
+
+def _load_tenant_keys() -> Dict[str, str]:
+    global _tenant_keys
     try:
-        cursor = conn.cursor()
-        
-        # Create transactions table with unique constraint
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transaction_date INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            amount REAL NOT NULL,
-            entry_type TEXT NOT NULL,
-            account_name TEXT NOT NULL,
+        mtime = os.stat(TENANT_KEYS_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if mtime != _tenant_keys[0]:
+        with open(TENANT_KEYS_FILE, 'r') as f:
+            _tenant_keys = (mtime, json.load(f))
+    return _tenant_keys[1]
+
+def _key_digest(key: str) -> str:
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def check_tenant_key(tenant: str, key: Optional[str]) -> bool:
+    """Whether key opens a tenant; the default tenant needs none, any other one the key made by create_tenant_key"""
+    if tenant == DEFAULT_TENANT:
+        return True
+    expected = _load_tenant_keys().get(tenant)
+    if not expected or not key:
+        return False
+    return hmac.compare_digest(_key_digest(key), expected)
+
+def create_tenant_key(tenant: str) -> str:
+    """
+    Generate a new access key for a tenant, replacing any previous one
+
+    Only the key's hash is stored in TENANT_KEYS_FILE; the key itself is
+    returned once, to be handed to the household.
+    """
+    tenant_db_path(tenant)
+    if tenant == DEFAULT_TENANT:
+        raise ValueError("The default tenant is served without a key")
+    key = secrets.token_urlsafe(32)
+    keys = dict(_load_tenant_keys())
+    keys[tenant] = _key_digest(key)
+    os.makedirs(os.path.dirname(os.path.abspath(TENANT_KEYS_FILE)), exist_ok=True)
+    temporary = f"{TENANT_KEYS_FILE}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(keys, f, indent=2, sort_keys=True)
+    os.replace(temporary, TENANT_KEYS_FILE)
+    return key
+
+def list_tenants() -> List[str]:
+    """The default tenant followed by every tenant with a database file"""
+    names = sorted(name[:-3] for name in os.listdir(TENANT_DIR) if name.endswith('.db')) \
+        if os.path.isdir(TENANT_DIR) else []
+    return [DEFAULT_TENANT] + [name for name in names if TENANT_ID.match(name) and name != DEFAULT_TENANT]
+
+# Tenant whose database the calls in the current thread or task use
+_tenant = contextvars.ContextVar('saldo_tenant', default=DEFAULT_TENANT)
+
+@contextmanager
+def use_tenant(tenant: str) -> Iterator[None]:
+    """Direct the database calls made inside the block to a tenant's database file"""
+    tenant_db_path(tenant)
+    token = _tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+def current_tenant() -> str:
+    return _tenant.get()
+
+def _database() -> TenantDatabase:
+    return tenants.get(_tenant.get())
+
+tenants = TenantPool()
+atexit.register(tenants.close_all)
+query_cache = QueryCache(QUERY_CACHE_MB * 1024 * 1024)
+
+def _connection_counts() -> List[Tuple[Tuple[str], int]]:
+    databases = tenants.databases()
+    return [
+        (('busy',), sum(database.manager.busy_connections for database in databases)),
+        (('idle',), sum(database.manager.idle_connections for database in databases))
+    ]
+
+metrics.Callback('saldo_db_connections', 'Pooled database connections by state, over all open tenants',
+                 _connection_counts, ['state'])
+metrics.Callback('saldo_db_open_tenants', 'Tenant databases currently open', lambda: len(tenants.databases()))
+metrics.Callback('saldo_query_cache_hits_total', 'Query cache lookups answered from memory',
+                 lambda: query_cache.hits, type='counter')
+metrics.Callback('saldo_query_cache_misses_total', 'Query cache lookups that ran the query',
+                 lambda: query_cache.misses, type='counter')
+metrics.Callback('saldo_query_cache_hit_ratio', 'Share of query cache lookups answered from memory',
+                 lambda: query_cache.hits / max(query_cache.hits + query_cache.misses, 1))
+metrics.Callback('saldo_query_cache_bytes', 'Serialized payload bytes held by the query cache',
+                 lambda: query_cache.size)
+
+def _migration_1_transactions(cursor: sqlite3.Cursor) -> None:
+    """Transactions table with its unique constraint and original indexes"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_date INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        amount REAL NOT NULL,
+        entry_type TEXT NOT NULL,
+        account_name TEXT NOT NULL,
+        category_name TEXT NOT NULL,
+        category_type TEXT,
+        category_icon TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(transaction_date, title, amount, account_name)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transaction_date ON transactions(transaction_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_category_name ON transactions(category_name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_account_name ON transactions(account_name)')
+
+def _migration_2_rollups(cursor: sqlite3.Cursor) -> None:
+    """Pre-aggregated totals per period x category x account x entry type"""
+    for table, period_column in ROLLUP_TABLES.items():
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {period_column} TEXT NOT NULL,
             category_name TEXT NOT NULL,
+            account_name TEXT NOT NULL,
+            entry_type TEXT NOT NULL,
             category_type TEXT,
             category_icon TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(transaction_date, title, amount, account_name)
-        )
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY ({period_column}, category_name, account_name, entry_type)
+        ) WITHOUT ROWID
         ''')
-        
-        # Create indices for common queries
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transaction_date ON transactions(transaction_date)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_category_name ON transactions(category_name)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_account_name ON transactions(account_name)')
-        
-        conn.commit()
-        logger.info("Database initialized successfully")
-        
+    # Backfilled by migration 6, which recreates these tables for the normalized schema
+
+def _migration_3_change_version(cursor: sqlite3.Cursor) -> None:
+    """Change counter used as the ETag of API responses"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS db_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('change_version', 0)")
+
+def _migration_4_access_path_indexes(cursor: sqlite3.Cursor) -> None:
+    """
+    Composite indexes for the real access patterns
+
+    The rowid (id) is implicitly the last key of every index, so these also
+    serve ORDER BY transaction_date, id.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_category_date ON transactions(category_name, transaction_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_account_date ON transactions(account_name, transaction_date)')
+    # Covers summaries over ranges that the rollup tables can't answer
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_date_summary ON transactions(
+        transaction_date, entry_type, category_name, category_type, category_icon, account_name, amount
+    )
+    ''')
+    # Superseded by the (name, date) composites above
+    cursor.execute('DROP INDEX IF EXISTS idx_category_name')
+    cursor.execute('DROP INDEX IF EXISTS idx_account_name')
+
+def _migration_5_title_search(cursor: sqlite3.Cursor) -> None:
+    """
+    Full-text index over transaction titles, kept in sync by triggers
+
+    unicode61 case-folds Cyrillic as well as Latin text and, with remove_diacritics,
+    lets "ї" match "і"; the prefix indexes make "Сільп*"-style queries cheap.
+    """
+    _create_title_search(cursor)
+    cursor.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+def _create_title_search(cursor: sqlite3.Cursor, schema: str = 'main') -> None:
+    """Full-text index over the titles of a schema's transactions table, with its triggers"""
+    cursor.execute(f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.transactions_fts USING fts5(
+        title,
+        content='transactions',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    ''')
+    _create_title_search_triggers(cursor, schema)
+
+def _create_title_search_triggers(cursor: sqlite3.Cursor, schema: str = 'main') -> None:
+    """Keep transactions_fts in step with the transactions table of the same schema"""
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {schema}.transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts (rowid, title) VALUES (new.id, new.title);
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {schema}.transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {schema}.transactions_fts_update AFTER UPDATE OF title ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO transactions_fts (rowid, title) VALUES (new.id, new.title);
+    END
+    ''')
+
+def _migration_6_normalized_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    Integer money and dimension tables for accounts and categories
+
+    Amounts become integer minor units, and account and category names move to
+    their own tables referenced by small integer ids, which shrinks rows and
+    indexes and lets GROUP BY compare integers. Transaction ids are kept, so
+    pagination cursors and the full-text index stay valid.
+    """
+    cursor.execute('''
+    CREATE TABLE accounts (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    ''')
+    # A missing type or icon is stored as '' so that the UNIQUE key holds
+    cursor.execute('''
+    CREATE TABLE categories (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL DEFAULT '',
+        icon TEXT NOT NULL DEFAULT '',
+        UNIQUE(name, type, icon)
+    )
+    ''')
+    cursor.execute('INSERT INTO accounts (name) SELECT DISTINCT account_name FROM transactions ORDER BY 1')
+    cursor.execute('''
+    INSERT INTO categories (name, type, icon)
+    SELECT DISTINCT category_name, IFNULL(category_type, ''), IFNULL(category_icon, '')
+    FROM transactions ORDER BY 1, 2, 3
+    ''')
+
+    cursor.execute(f'''
+    CREATE TABLE transactions_normalized (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_date INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        amount_minor INTEGER NOT NULL,
+        entry_type INTEGER NOT NULL CHECK (entry_type BETWEEN 0 AND {len(ENTRY_TYPES) - 1}),
+        account_id INTEGER NOT NULL REFERENCES accounts(id),
+        category_id INTEGER NOT NULL REFERENCES categories(id),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(transaction_date, account_id, amount_minor, title)
+    )
+    ''')
+    entry_type_case = ' '.join(f"WHEN '{name}' THEN {index}" for index, name in enumerate(ENTRY_TYPES))
+    cursor.execute(f'''
+    INSERT INTO transactions_normalized (
+        id, transaction_date, title, amount_minor, entry_type, account_id, category_id, created_at
+    )
+    SELECT
+        t.id,
+        t.transaction_date,
+        t.title,
+        CAST(ROUND(t.amount * {MINOR_UNITS}) AS INTEGER),
+        CASE t.entry_type {entry_type_case} END,
+        a.id,
+        c.id,
+        t.created_at
+    FROM transactions t
+    JOIN accounts a ON a.name = t.account_name
+    JOIN categories c ON c.name = t.category_name
+        AND c.type = IFNULL(t.category_type, '') AND c.icon = IFNULL(t.category_icon, '')
+    ORDER BY t.id
+    ''')
+    # Dropping the old table also drops its indexes and the full-text triggers
+    cursor.execute('DROP TABLE transactions')
+    cursor.execute('ALTER TABLE transactions_normalized RENAME TO transactions')
+    _create_title_search_triggers(cursor)
+
+    cursor.execute('CREATE INDEX idx_transaction_date ON transactions(transaction_date)')
+    cursor.execute('CREATE INDEX idx_category_date ON transactions(category_id, transaction_date)')
+    cursor.execute('CREATE INDEX idx_account_date ON transactions(account_id, transaction_date)')
+    cursor.execute('''
+    CREATE INDEX idx_date_summary ON transactions(
+        transaction_date, entry_type, category_id, account_id, amount_minor
+    )
+    ''')
+
+    for table, period_column in ROLLUP_TABLES.items():
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'''
+        CREATE TABLE {table} (
+            {period_column} TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            account_id INTEGER NOT NULL,
+            entry_type INTEGER NOT NULL,
+            total_minor INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY ({period_column}, category_id, account_id, entry_type)
+        ) WITHOUT ROWID
+        ''')
+    _rebuild_rollups(cursor)
+
+def _migration_7_archives(cursor: sqlite3.Cursor) -> None:
+    """Registry of closed years moved out to per-year archive files"""
+    cursor.execute('''
+    CREATE TABLE archives (
+        year INTEGER PRIMARY KEY,
+        row_count INTEGER NOT NULL DEFAULT 0,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def _create_archive_schema(cursor: sqlite3.Cursor, schema: str) -> None:
+    """
+    Transactions table of an attached archive file, if it isn't there yet
+
+    Rows keep their ids and columns, and names stay in the dimension tables of
+    the hot database. Archives are written once and read rarely, so the only
+    index besides the primary key is the UNIQUE one, which leads with
+    transaction_date and so serves range scans as well; title search keeps
+    its full-text index.
+    """
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {schema}.transactions (
+        id INTEGER PRIMARY KEY,
+        transaction_date INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        amount_minor INTEGER NOT NULL,
+        entry_type INTEGER NOT NULL,
+        account_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(transaction_date, account_id, amount_minor, title)
+    )
+    ''')
+    _create_title_search(cursor, schema)
+
+# Schema migrations in order; PRAGMA user_version holds how many have been applied.
+# Append new ones, never edit applied ones. Databases created before versioning
+# start at 0, which is why the early migrations use IF NOT EXISTS.
+MIGRATIONS = [
+    _migration_1_transactions,
+    _migration_2_rollups,
+    _migration_3_change_version,
+    _migration_4_access_path_indexes,
+    _migration_5_title_search,
+    _migration_6_normalized_schema,
+    _migration_7_archives
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending schema migrations, each in its own transaction
+
+    BEGIN IMMEDIATE takes the write lock before user_version is re-read, so
+    concurrent workers or scripts starting at once apply every migration once.
+
+    Returns:
+        Number of migrations applied
+    """
+    applied = 0
+    while conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                break
+            migration = MIGRATIONS[version]
+            migration(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied += 1
+        logger.info("Applied migration %s: %s", version + 1, migration.__doc__.strip().splitlines()[0])
+    return applied
+
+def init_db() -> int:
+    """
+    Bring the schema of the current tenant's database up to date
+
+    Connections also do this lazily the first time a database is opened, so
+    calling it is only needed to migrate ahead of time.
+
+    Returns:
+        Number of migrations applied
+    """
+    try:
+        applied = _database().manager.ensure_schema()
+        logger.info("Database schema at version %s", SCHEMA_VERSION)
+        return applied
     except Exception as e:
-        logger.error(f"Error initializing database: {str(e)}")
+        logger.error("Error initializing database: %s", e)
         raise
-    finally:
-        conn.close()
 
 def insert_transaction(transaction: Dict) -> bool:
     """Insert a single transaction into the database"""
+    was_inserted = insert_transactions([transaction]) > 0
+    if not was_inserted:
+        logger.debug("Skipped duplicate transaction")
+    return was_inserted
+
+@metrics.QUERY_SECONDS.time(function='insert_transactions')
+def insert_transactions(transactions: List[Dict]) -> int:
+    """
+    Insert multiple transactions into the database
+
+    Transactions dated in an archived year go to that year's archive file, so
+    a late sync of old history never puts rows back into the hot table.
+    Each of these groups is committed on its own; if one fails, the count of
+    the groups committed before it is returned.
+    """
+    database = _database()
+    manager = database.manager
+    conn = manager.acquire()
+    success_count = 0
+    year = None
     try:
-        # Extract master and category entries
-        master_entry = next((entry for entry in transaction['journalList'] if entry['master']), None)
-        category_entry = next((entry for entry in transaction['journalList'] if not entry['master']), None)
-        
-        if not master_entry or not category_entry:
-            logger.error("Missing master or category entry")
-            return False
-        
-        conn = get_db()
         cursor = conn.cursor()
-        
-        # Use INSERT OR IGNORE to skip duplicates
-        cursor.execute('''
-        INSERT OR IGNORE INTO transactions (
-            transaction_date,
-            title,
-            amount,
-            entry_type,
-            account_name,
-            category_name,
-            category_type,
-            category_icon
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            transaction['transactionDate'],
-            transaction['title'],
-            master_entry['amount'],
-            master_entry['entryType'],
-            master_entry['account']['name'],
-            category_entry['account']['name'],
-            category_entry['account'].get('type'),
-            category_entry['account'].get('icon')
-        ))
-        
-        conn.commit()
-        
-        # Check if a row was actually inserted
-        was_inserted = cursor.rowcount > 0
-        if not was_inserted:
-            logger.debug("Skipped duplicate transaction")
-        
-        conn.close()
-        return was_inserted
+        # Under the write lock, so no year gets archived before the hot rows are in
+        conn.execute('BEGIN IMMEDIATE')
+        archived = _archived_years(cursor)
+        cutoff = archived[0] + 1 if archived else None
+
+        # Rows grouped by where they belong: None for the hot table, else an archived year
+        groups = defaultdict(list)
+        for transaction in transactions:
+            group = None
+            if cutoff is not None:
+                try:
+                    group = _local_year(transaction['transactionDate'])
+                except (KeyError, TypeError, ValueError, OverflowError):
+                    pass  # Logged by _insert_rows like any other malformed transaction
+                if group is not None and group >= cutoff:
+                    group = None
+            groups[group].append(transaction)
+        if None not in groups:
+            conn.rollback()  # Archives can only be attached outside a transaction
+
+        dimension_ids = {}
+        # The hot table first, in the transaction that read the archived years
+        for year, batch in sorted(groups.items(), key=lambda group: group[0] is not None):
+            with _segment(conn, database, year, create=True) as schema:
+                if not conn.in_transaction:
+                    # Locks the hot database and the archive together, in the same order for every writer
+                    conn.execute('BEGIN IMMEDIATE')
+                inserted, rollup_deltas = _insert_rows(cursor, batch, schema, dimension_ids)
+                # Rollups are committed together with the rows they summarise
+                if inserted:
+                    if year is not None:
+                        cursor.execute('''
+                        INSERT INTO archives (year, row_count) VALUES (?, ?)
+                        ON CONFLICT (year) DO UPDATE SET row_count = row_count + excluded.row_count
+                        ''', (year, inserted))
+                    _apply_rollup_deltas(cursor, rollup_deltas)
+                    _bump_change_version(cursor)
+                conn.commit()
+            success_count += inserted
+        metrics.QUERY_ROWS.observe(success_count, function='insert_transactions')
+        return success_count
         
     except Exception as e:
-        logger.error(f"Error inserting transaction: {str(e)}")
-        return False
+        logger.error("Error in bulk insert into %s, after %s rows were committed: %s",
+                     'the hot table' if year is None else f'the {year} archive', success_count, e)
+        return success_count
+    finally:
+        manager.release(conn)
 
-def insert_transactions(transactions: List[Dict]) -> int:
-    """Insert multiple transactions into the database"""
-    conn = get_db()
+def _insert_rows(cursor: sqlite3.Cursor, transactions: List[Dict], schema: str,
+                 dimension_ids: Dict[Tuple, int]) -> Tuple[int, Dict[Tuple, List]]:
+    """
+    Insert transactions into the transactions table of a schema, skipping duplicates and malformed ones
+
+    Returns:
+        Tuple of (rows inserted, rollup deltas of those rows)
+    """
+    success_count = 0
+    rollup_deltas = defaultdict(lambda: [0, 0])
+    for transaction in transactions:
+        try:
+            # Extract master and category entries
+            master_entry = next((entry for entry in transaction['journalList'] if entry['master']), None)
+            category_entry = next((entry for entry in transaction['journalList'] if not entry['master']), None)
+            
+            if not master_entry or not category_entry:
+                logger.error("Missing master or category entry")
+                continue
+            
+            entry_type = ENTRY_TYPE_IDS.get(master_entry['entryType'])
+            if entry_type is None:
+                raise ValueError(f"Unknown entry type: {master_entry['entryType']}")
+            amount_minor = round(master_entry['amount'] * MINOR_UNITS)
+            account_id = _dimension_id(cursor, dimension_ids, 'accounts', {
+                'name': master_entry['account']['name']
+            })
+            category_id = _dimension_id(cursor, dimension_ids, 'categories', {
+                'name': category_entry['account']['name'],
+                'type': category_entry['account'].get('type') or '',
+                'icon': category_entry['account'].get('icon') or ''
+            })
+
+            # Use INSERT OR IGNORE to skip duplicates
+            cursor.execute(f'''
+            INSERT OR IGNORE INTO {schema}.transactions (
+                transaction_date,
+                title,
+                amount_minor,
+                entry_type,
+                account_id,
+                category_id
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                transaction['transactionDate'],
+                transaction['title'],
+                amount_minor,
+                entry_type,
+                account_id,
+                category_id
+            ))
+            
+            if cursor.rowcount > 0:
+                success_count += 1
+                key = (_local_day(transaction['transactionDate']), category_id, account_id, entry_type)
+                rollup_deltas[key][0] += amount_minor
+                rollup_deltas[key][1] += 1
+            
+        except Exception as e:
+            logger.error("Error inserting transaction: %s", e)
+            continue
+    return success_count, rollup_deltas
+
+def _dimension_id(cursor: sqlite3.Cursor, cache: Dict[Tuple, int], table: str, values: Dict[str, str]) -> int:
+    """
+    Id of the accounts or categories row with these values, created on first use
+
+    Args:
+        cache: Ids already resolved in this batch, so each one is looked up once
+        table: 'accounts' or 'categories'
+        values: Column -> value, matching the table's UNIQUE key
+    """
+    key = (table, *values.values())
+    if key not in cache:
+        columns = ', '.join(values)
+        cursor.execute(
+            f"INSERT OR IGNORE INTO {table} ({columns}) VALUES ({', '.join('?' * len(values))})",
+            list(values.values())
+        )
+        cursor.execute(
+            f"SELECT id FROM {table} WHERE {' AND '.join(f'{column} = ?' for column in values)}",
+            list(values.values())
+        )
+        cache[key] = cursor.fetchone()[0]
+    return cache[key]
+
+def _local_day(timestamp: int) -> str:
+    """Convert a timestamp in milliseconds to its local calendar day (YYYY-MM-DD)"""
+    return datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d')
+
+def _apply_rollup_deltas(cursor: sqlite3.Cursor, deltas: Dict[Tuple, List]) -> None:
+    """Add per-day totals of freshly inserted rows to the daily and monthly rollups"""
+    monthly = defaultdict(lambda: [0, 0])
+    for (day, *dimensions), (total, count) in deltas.items():
+        monthly[(day[:7], *dimensions)][0] += total
+        monthly[(day[:7], *dimensions)][1] += count
+
+    for table, period_column in ROLLUP_TABLES.items():
+        table_deltas = deltas if period_column == 'day' else monthly
+        cursor.executemany(f'''
+        INSERT INTO {table} ({period_column}, category_id, account_id, entry_type, total_minor, count)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT ({period_column}, category_id, account_id, entry_type) DO UPDATE SET
+            total_minor = total_minor + excluded.total_minor,
+            count = count + excluded.count
+        ''', [(*key, total, count) for key, (total, count) in table_deltas.items()])
+
+def _bump_change_version(cursor: sqlite3.Cursor) -> None:
+    """Mark the data as changed; must run inside the writing transaction"""
+    cursor.execute("UPDATE db_meta SET value = value + 1 WHERE key = 'change_version'")
+
+def get_change_version() -> int:
+    """Get a cheap marker that advances whenever transactions or rollups change"""
+    return _database().reader.change_version()
+
+def _daily_totals_query(table: str) -> str:
+    """Per-day totals of a transactions table, in the column order of daily_rollups"""
+    return f'''
+    SELECT
+        strftime('%Y-%m-%d', transaction_date / 1000, 'unixepoch', 'localtime') AS day,
+        category_id,
+        account_id,
+        entry_type,
+        SUM(amount_minor),
+        COUNT(*)
+    FROM {table}
+    GROUP BY day, category_id, account_id, entry_type
+    '''
+
+def _rebuild_rollups(cursor: sqlite3.Cursor, archived_days: List[Tuple] = ()) -> None:
+    """
+    Recompute every rollup table from the transactions table
+
+    Args:
+        archived_days: daily_rollups rows of the archived years, computed beforehand
+    """
+    cursor.execute('DELETE FROM daily_rollups')
+    cursor.execute('INSERT INTO daily_rollups (day, category_id, account_id, entry_type, total_minor, count)'
+                   + _daily_totals_query('main.transactions'))
+    cursor.executemany('''
+    INSERT INTO daily_rollups (day, category_id, account_id, entry_type, total_minor, count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', archived_days)
+    cursor.execute('DELETE FROM monthly_rollups')
+    cursor.execute('''
+    INSERT INTO monthly_rollups (month, category_id, account_id, entry_type, total_minor, count)
+    SELECT
+        substr(day, 1, 7) AS month,
+        category_id,
+        account_id,
+        entry_type,
+        SUM(total_minor),
+        SUM(count)
+    FROM daily_rollups
+    GROUP BY month, category_id, account_id, entry_type
+    ''')
+
+def rebuild_rollups() -> None:
+    """Rebuild the daily and monthly rollup tables from scratch, archived years included"""
+    database = _database()
+    manager = database.manager
+    conn = manager.acquire()
     try:
         cursor = conn.cursor()
-        success_count = 0
-        
-        for transaction in transactions:
-            try:
-                # Extract master and category entries
-                master_entry = next((entry for entry in transaction['journalList'] if entry['master']), None)
-                category_entry = next((entry for entry in transaction['journalList'] if not entry['master']), None)
-                
-                if not master_entry or not category_entry:
-                    logger.error("Missing master or category entry")
-                    continue
-                
-                # Use INSERT OR IGNORE to skip duplicates
-                cursor.execute('''
-                INSERT OR IGNORE INTO transactions (
-                    transaction_date,
-                    title,
-                    amount,
-                    entry_type,
-                    account_name,
-                    category_name,
-                    category_type,
-                    category_icon
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    transaction['transactionDate'],
-                    transaction['title'],
-                    master_entry['amount'],
-                    master_entry['entryType'],
-                    master_entry['account']['name'],
-                    category_entry['account']['name'],
-                    category_entry['account'].get('type'),
-                    category_entry['account'].get('icon')
-                ))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error inserting transaction: {str(e)}")
-                continue
-        
+        # Archives are attached one at a time, before the transaction that swaps the rollups in
+        archived_days = []
+        for year in _archived_years(cursor):
+            with _segment(conn, database, year) as schema:
+                cursor.execute(_daily_totals_query(f'{schema}.transactions'))
+                archived_days.extend(tuple(row) for row in cursor.fetchall())
+        _rebuild_rollups(cursor, archived_days)
+        _bump_change_version(cursor)
         conn.commit()
-        return success_count
-        
+        logger.info("Rollup tables rebuilt successfully")
     except Exception as e:
-        logger.error(f"Error in bulk insert: {str(e)}")
-        return 0
+        logger.error("Error rebuilding rollups: %s", e)
+        raise
     finally:
+        manager.release(conn)
+
+def clear_transactions() -> None:
+    """Delete all transactions together with their rollups and archive files"""
+    database = _database()
+    manager = database.manager
+    conn = manager.acquire()
+    try:
+        cursor = conn.cursor()
+        years = _archived_years(cursor)
+        cursor.execute('DELETE FROM transactions')
+        cursor.execute('DELETE FROM archives')
+        for table in ROLLUP_TABLES:
+            cursor.execute(f'DELETE FROM {table}')
+        _bump_change_version(cursor)
+        conn.commit()
+    finally:
+        manager.release(conn)
+
+    for year in years:
+        try:
+            os.remove(database.archive_path(year))
+        except FileNotFoundError:
+            pass
+
+def _local_year(timestamp: int) -> int:
+    """Local calendar year of a timestamp in milliseconds"""
+    return datetime.fromtimestamp(timestamp / 1000).year
+
+def _year_range(year: int) -> Tuple[int, int]:
+    """First and last millisecond of a local calendar year"""
+    start = datetime(year, 1, 1)
+    return int(start.timestamp() * 1000), int(start.replace(year=year + 1).timestamp() * 1000) - 1
+
+def _archived_years(cursor: sqlite3.Cursor) -> List[int]:
+    """Years moved out to archive files, newest first"""
+    cursor.execute('SELECT year FROM archives ORDER BY year DESC')
+    return [row[0] for row in cursor.fetchall()]
+
+def _segments(cursor: sqlite3.Cursor, start_date: Optional[int], end_date: Optional[int]) -> List[Optional[int]]:
+    """
+    Where the rows of a date range live, newest first: None for the hot table, else an archived year
+
+    The hot table is skipped when the range ends before its oldest row, so a
+    range within archived years never scans it, and one after the last
+    archived year never opens an archive.
+    """
+    archived = _archived_years(cursor)
+    if not archived:
+        return [None]
+    if start_date is None or end_date is None:
+        return [None] + archived
+    first, last = _local_year(start_date), _local_year(end_date)
+    cursor.execute('SELECT MIN(transaction_date) FROM main.transactions')
+    oldest = cursor.fetchone()[0]
+    segments = [None] if oldest is not None and _local_year(oldest) <= last else []
+    return segments + [year for year in archived if first <= year <= last]
+
+@contextmanager
+def _segment(conn: sqlite3.Connection, database: TenantDatabase, year: Optional[int],
+             create: bool = False) -> Iterator[str]:
+    """
+    Schema under which the transactions table of a segment can be queried inside the block
+
+    The hot table is always in 'main'. An archived year's file is attached as
+    ARCHIVE_SCHEMA and detached afterwards; a transaction still open then is
+    rolled back, since files can only be detached outside of one. Cursors
+    reading from the archive must be exhausted or closed before the block ends.
+
+    Args:
+        create: Create the archive file and its tables if they don't exist yet (for writes)
+    """
+    if year is None:
+        yield 'main'
+        return
+
+    path = database.archive_path(year)
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    uri = f"{pathlib.Path(path).resolve().as_uri()}?mode={'rwc' if create else 'ro'}"
+    if getattr(conn, 'snapshot', None) is not None:
+        uri += f"&vfs={ARCHIVE_VFS}"
+    conn.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (uri,))
+    try:
+        if create:
+            _create_archive_schema(conn.cursor(), ARCHIVE_SCHEMA)
+        yield ARCHIVE_SCHEMA
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f'DETACH DATABASE {ARCHIVE_SCHEMA}')
+
+def _open_archive(database: TenantDatabase, year: int) -> sqlite3.Connection:
+    """Connection of its own to a year's archive file, created if needed, with the hot database attached as 'hot'"""
+    path = database.archive_path(year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    try:
+        _create_archive_schema(conn.cursor(), 'main')
+        conn.execute('ATTACH DATABASE ? AS hot', (database.manager.path,))
+    except Exception:
         conn.close()
+        raise
+    return conn
+
+@metrics.QUERY_SECONDS.time(function='archive_history')
+def archive_history(before_year: int) -> Dict[int, int]:
+    """
+    Move every transaction dated before before_year out of the hot table into per-year archive files
+
+    Each year is copied into its archive file first. The hot database's write
+    lock is then taken, so no insert can slip in, the copy catches up on rows
+    that arrived meanwhile and commits, and only then are the rows deleted
+    from the hot table and the year registered. A crash at any point leaves
+    duplicates in the archive, which the next run ignores, never gaps. From
+    then on reads find the year in its archive, and inserts dated in it are
+    written there. The rollups keep covering every year, so summaries over
+    day-aligned ranges never open an archive.
 
+    Args:
+        before_year: First year to keep in the hot table; must not lie in the future
+
+    Returns:
+        Rows moved per archived year
+    """
+    if before_year > datetime.now().year:
+        raise ValueError("Only closed years can be archived")
+
+    database = _database()
+    manager = database.manager
+    conn = manager.acquire()
+    moved = {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT MIN(transaction_date) FROM transactions')
+        oldest = cursor.fetchone()[0]
+        for year in range(_local_year(oldest) if oldest is not None else before_year, before_year):
+            start_date, end_date = _year_range(year)
+            cursor.execute('SELECT 1 FROM transactions WHERE transaction_date BETWEEN ? AND ? LIMIT 1',
+                           (start_date, end_date))
+            if cursor.fetchone() is None:
+                continue
+
+            archive = _open_archive(database, year)
+            try:
+                copy = '''
+                INSERT OR IGNORE INTO main.transactions (
+                    id, transaction_date, title, amount_minor, entry_type, account_id, category_id, created_at
+                )
+                SELECT id, transaction_date, title, amount_minor, entry_type, account_id, category_id, created_at
+                FROM hot.transactions
+                WHERE transaction_date BETWEEN ? AND ?
+                ORDER BY transaction_date, id
+                '''
+                archive.execute(copy, (start_date, end_date))
+                archive.commit()
+                # Compact the file while nobody else uses it yet; stragglers copied below are few
+                archive.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('optimize')")
+                archive.commit()
+                archive.execute('VACUUM')
+
+                conn.execute('BEGIN IMMEDIATE')
+                archive.execute(copy, (start_date, end_date))
+                archive.commit()
+                cursor.execute('DELETE FROM transactions WHERE transaction_date BETWEEN ? AND ?',
+                               (start_date, end_date))
+                moved[year] = cursor.rowcount
+                row_count = archive.execute('SELECT COUNT(*) FROM main.transactions').fetchone()[0]
+                cursor.execute('INSERT OR REPLACE INTO archives (year, row_count) VALUES (?, ?)', (year, row_count))
+                _bump_change_version(cursor)
+                conn.commit()
+            finally:
+                archive.close()
+            logger.info("Archived %s transactions of %s", moved[year], year)
+
+        if moved:
+            # Merge the full-text index after the deletes and give the freed pages back to the filesystem
+            cursor.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('optimize')")
+            conn.commit()
+            conn.execute('VACUUM')
+        metrics.QUERY_ROWS.observe(sum(moved.values()), function='archive_history')
+        return moved
+    except Exception as e:
+        logger.error("Error archiving history: %s", e)
+        raise
+    finally:
+        manager.release(conn)
+
+def _row_to_transaction(row: sqlite3.Row) -> Dict:
+    """Convert a transactions row back into the nested journalList format of the API"""
+    amount = row['amount_minor'] / MINOR_UNITS
+    return {
+        'transactionDate': row['transaction_date'],
+        'title': row['title'],
+        'journalList': [
+            {
+                'master': True,
+                'entryType': ENTRY_TYPES[row['entry_type']],
+                'amount': amount,
+                'account': {'name': row['account_name']}
+            },
+            {
+                'master': False,
+                'entryType': ENTRY_TYPES[1 - row['entry_type']],
+                'amount': amount,
+                'account': {
+                    'name': row['category_name'],
+                    'type': row['category_type'],
+                    'icon': row['category_icon']
+                }
+            }
+        ]
+    }
+
+def encode_cursor(transaction_date: int, transaction_id: int) -> str:
+    """Encode the (transaction_date, id) position of a row as a pagination cursor"""
+    return f"{transaction_date}_{transaction_id}"
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Decode a pagination cursor produced by encode_cursor"""
+    try:
+        transaction_date, transaction_id = cursor.split('_')
+        return int(transaction_date), int(transaction_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def _dimension_ids(cursor: sqlite3.Cursor, table: str, name: str) -> List[int]:
+    """Ids of the accounts or categories rows with this name (categories may repeat one with another type)"""
+    cursor.execute(f"SELECT id FROM {table} WHERE name = ?", (name,))
+    return [row[0] for row in cursor.fetchall()]
+
+def _id_condition(column: str, ids: List[int]) -> str:
+    # A single id keeps the (id, transaction_date) index in newest-first order; a list needs a sort
+    return f"{column} = ?" if len(ids) == 1 else f"{column} IN ({', '.join('?' * len(ids))})"
+
+def _transactions_query(start_date: Optional[int], end_date: Optional[int],
+                        after: Optional[Tuple[int, int]] = None, category_ids: Optional[List[int]] = None,
+                        account_ids: Optional[List[int]] = None, schema: str = 'main') -> Tuple[str, List]:
+    """
+    Build the newest-first transactions query for an optional range, filters and keyset position
+
+    Filters are ids resolved by name with _dimension_ids beforehand, so that the
+    planner sees constants and can lead with the (id, transaction_date) indexes.
+    schema selects the hot table ('main') or an attached archive (see _segment).
+    """
+    query = f"SELECT {TRANSACTION_COLUMNS} FROM {schema}.transactions t{TRANSACTION_JOINS}"
+    conditions = []
+    params = []
+
+    if category_ids is not None:
+        conditions.append(_id_condition("t.category_id", category_ids))
+        params.extend(category_ids)
+    if account_ids is not None:
+        conditions.append(_id_condition("t.account_id", account_ids))
+        params.extend(account_ids)
+
+    if start_date is not None and end_date is not None:
+        conditions.append("t.transaction_date BETWEEN ? AND ?")
+        params.extend([start_date, end_date])
+
+    if after is not None:
+        # Rows strictly after the cursor in (transaction_date DESC, id DESC) order
+        conditions.append("(t.transaction_date < ? OR (t.transaction_date = ? AND t.id < ?))")
+        params.extend([after[0], after[0], after[1]])
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += " ORDER BY t.transaction_date DESC, t.id DESC"
+    return query, params
+
+@metrics.QUERY_SECONDS.time(function='get_transactions')
 def get_transactions(start_date: Optional[int] = None, end_date: Optional[int] = None) -> List[Dict]:
-    """Get transactions with optional date range"""
-    conn = get_db()
+    """Get all transactions with optional date range, from the archive files too where the range needs them"""
+    database = _database()
+    reader = database.reader
+    conn = reader.acquire()
     try:
         cursor = conn.cursor()
         
-        query = "SELECT * FROM transactions"
-        params = []
-        
-        if start_date is not None and end_date is not None:
-            query += " WHERE transaction_date BETWEEN ? AND ?"
-            params.extend([start_date, end_date])
-        
-        query += " ORDER BY transaction_date DESC"
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        
-        # Convert rows to list of dicts
-        transactions = []
-        for row in rows:
-            transactions.append({
-                'transactionDate': row['transaction_date'],
-                'title': row['title'],
-                'journalList': [
-                    {
-                        'master': True,
-                        'entryType': row['entry_type'],
-                        'amount': row['amount'],
-                        'account': {'name': row['account_name']}
-                    },
-                    {
-                        'master': False,
-                        'entryType': 'DEBIT' if row['entry_type'] == 'CREDIT' else 'CREDIT',
-                        'amount': row['amount'],
-                        'account': {
-                            'name': row['category_name'],
-                            'type': row['category_type'],
-                            'icon': row['category_icon']
-                        }
-                    }
-                ]
-            })
-        
-        return transactions
+        rows = []
+        for year in _segments(cursor, start_date, end_date):
+            with _segment(conn, database, year) as schema:
+                query, params = _transactions_query(start_date, end_date, schema=schema)
+                cursor.execute(query, params)
+                rows.extend(cursor.fetchall())
+        metrics.QUERY_ROWS.observe(len(rows), function='get_transactions')
+
+        return [_row_to_transaction(row) for row in rows]
         
     except Exception as e:
-        logger.error(f"Error getting transactions: {str(e)}")
+        logger.error("Error getting transactions: %s", e)
         return []
     finally:
-        conn.close()
+        reader.release(conn)
+
+def iter_transactions(start_date: Optional[int] = None, end_date: Optional[int] = None,
+                      batch_size: int = 500) -> Iterator[Dict]:
+    """
+    Lazily yield transactions newest first, fetching rows from the cursor in batches
+
+    Unlike get_transactions, errors propagate to the caller, since a consumer
+    that is already streaming needs to know the data ended early. The recorded
+    query time includes the time the consumer spends between batches.
+    """
+    started = time.perf_counter()
+    count = 0
+    database = _database()
+    reader = database.reader
+    conn = reader.acquire()
+    try:
+        for year in _segments(conn.cursor(), start_date, end_date):
+            with _segment(conn, database, year) as schema:
+                cursor = conn.cursor()
+                try:
+                    query, params = _transactions_query(start_date, end_date, schema=schema)
+                    cursor.execute(query, params)
+
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        count += len(rows)
+                        for row in rows:
+                            yield _row_to_transaction(row)
+                finally:
+                    # An archive can't be detached while a statement still reads from it
+                    cursor.close()
+    finally:
+        reader.release(conn)
+        metrics.QUERY_SECONDS.observe(time.perf_counter() - started, function='iter_transactions')
+        metrics.QUERY_ROWS.observe(count, function='iter_transactions')
+
+@metrics.QUERY_SECONDS.time(function='get_transactions_page')
+def _fetch_page(start_date: Optional[int], end_date: Optional[int], limit: int, after: Optional[str],
+                category: Optional[str] = None, account: Optional[str] = None) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    """Fetch the raw rows of one keyset page together with the cursor of the next one"""
+    position = decode_cursor(after) if after else None
+
+    database = _database()
+    reader = database.reader
+    conn = reader.acquire()
+    try:
+        cursor = conn.cursor()
+
+        category_ids = _dimension_ids(cursor, 'categories', category) if category is not None else None
+        account_ids = _dimension_ids(cursor, 'accounts', account) if account is not None else None
+        # Fetch one extra row to learn whether another page follows; older segments only fill what's missing
+        rows = []
+        for year in _segments(cursor, start_date, end_date):
+            with _segment(conn, database, year) as schema:
+                query, params = _transactions_query(start_date, end_date, position, category_ids, account_ids, schema)
+                cursor.execute(query + " LIMIT ?", params + [limit + 1 - len(rows)])
+                rows.extend(cursor.fetchall())
+            if len(rows) > limit:
+                break
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['transaction_date'], rows[-1]['id'])
+
+        metrics.QUERY_ROWS.observe(len(rows), function='get_transactions_page')
+        return rows, next_cursor
+
+    except Exception as e:
+        logger.error("Error getting transactions page: %s", e)
+        raise
+    finally:
+        reader.release(conn)
+
+def get_transactions_page(start_date: Optional[int] = None, end_date: Optional[int] = None,
+                          limit: int = 100, after: Optional[str] = None, category: Optional[str] = None,
+                          account: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Get one page of transactions, newest first, using keyset pagination
+
+    Args:
+        start_date: Range start (timestamp in milliseconds)
+        end_date: Range end (timestamp in milliseconds)
+        limit: Maximum number of transactions to return
+        after: Cursor returned with the previous page, or None for the first page
+        category: Only return transactions in this category
+        account: Only return transactions of this account
+
+    Returns:
+        Tuple of (transactions, cursor of the next page or None when this was the last one)
+
+    Errors propagate so that callers caching the result never cache a failure.
+    """
+    rows, next_cursor = _fetch_page(start_date, end_date, limit, after, category, account)
+    return [_row_to_transaction(row) for row in rows], next_cursor
+
+def get_transactions_page_columnar(start_date: Optional[int] = None, end_date: Optional[int] = None,
+                                   limit: int = 100, after: Optional[str] = None, category: Optional[str] = None,
+                                   account: Optional[str] = None) -> Tuple[Dict, Optional[str]]:
+    """
+    Get one page of transactions as column arrays instead of nested journalList objects
+
+    Account names, categories and entry types are dictionary-encoded: their columns
+    hold indexes into the lists under 'dictionaries', so each distinct value is sent
+    once per page.
+
+    Returns:
+        Tuple of ({'columns': ..., 'dictionaries': ...}, cursor of the next page or None)
+    """
+    rows, next_cursor = _fetch_page(start_date, end_date, limit, after, category, account)
+    return _rows_to_columns(rows), next_cursor
+
+def _rows_to_columns(rows: List[sqlite3.Row]) -> Dict:
+    """Convert transactions rows into dictionary-encoded column arrays"""
+    columns = {name: [] for name in ('transactionDate', 'title', 'amount', 'entryType', 'account', 'category')}
+    codes = {'entryTypes': {}, 'accounts': {}, 'categories': {}}
+
+    def encode(dictionary: str, value: Hashable) -> int:
+        return codes[dictionary].setdefault(value, len(codes[dictionary]))
+
+    for row in rows:
+        columns['transactionDate'].append(row['transaction_date'])
+        columns['title'].append(row['title'])
+        columns['amount'].append(row['amount_minor'] / MINOR_UNITS)
+        columns['entryType'].append(encode('entryTypes', ENTRY_TYPES[row['entry_type']]))
+        columns['account'].append(encode('accounts', row['account_name']))
+        columns['category'].append(encode('categories', (row['category_name'], row['category_type'], row['category_icon'])))
+
+    return {
+        'columns': columns,
+        'dictionaries': {
+            'entryTypes': list(codes['entryTypes']),
+            'accounts': list(codes['accounts']),
+            'categories': [
+                {'name': name, 'type': category_type, 'icon': icon}
+                for name, category_type, icon in codes['categories']
+            ]
+        }
+    }
+
+def _match_expression(text: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix
+
+    Words are quoted so that FTS5 operators typed by the user are searched for
+    literally instead of being interpreted.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        raise ValueError("Search query must contain at least one letter or digit")
+    return ' '.join(f'"{word}"*' for word in words)
+
+def _search_query(text: str, start_date: Optional[int], end_date: Optional[int],
+                  schema: str = 'main') -> Tuple[str, List]:
+    """Build the ranked title search, best matches first and newest first among equals"""
+    query = (
+        f"SELECT {TRANSACTION_COLUMNS} FROM {schema}.transactions_fts f"
+        f" JOIN {schema}.transactions t ON t.id = f.rowid{TRANSACTION_JOINS}"
+        " WHERE f.transactions_fts MATCH ?"
+    )
+    params = [_match_expression(text)]
+
+    if start_date is not None and end_date is not None:
+        query += " AND t.transaction_date BETWEEN ? AND ?"
+        params.extend([start_date, end_date])
+
+    query += " ORDER BY f.rank, t.transaction_date DESC, t.id DESC"
+    return query, params
+
+@metrics.QUERY_SECONDS.time(function='search_transactions')
+def search_transactions(text: str, start_date: Optional[int] = None, end_date: Optional[int] = None,
+                        limit: int = 100, after: Optional[str] = None,
+                        columnar: bool = False) -> Tuple[object, Optional[str]]:
+    """
+    Full-text search over transaction titles, ranked by relevance (bm25)
+
+    Archived years are searched after the hot table, newest year first: each
+    archive file has its own bm25 statistics, so results are ranked within a
+    year rather than across years.
+
+    Args:
+        text: Words to look for; each one matches as a prefix
+        start_date: Range start (timestamp in milliseconds)
+        end_date: Range end (timestamp in milliseconds)
+        limit: Maximum number of transactions to return
+        after: Cursor returned with the previous page, or None for the first page
+        columnar: Return column arrays like get_transactions_page_columnar
+
+    Returns:
+        Tuple of (transactions, cursor of the next page or None when this was the last one)
+    """
+    # Ranked results have no stable keyset position, so the cursor is an offset
+    try:
+        offset = int(after) if after else 0
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {after}")
+    if offset < 0:
+        raise ValueError(f"Invalid cursor: {after}")
+    query, params = _search_query(text, start_date, end_date)
+
+    database = _database()
+    reader = database.reader
+    conn = reader.acquire()
+    try:
+        cursor = conn.cursor()
+        # Segments are searched newest first, each continuing where the previous one ran out
+        rows, skip = [], offset
+        for year in _segments(cursor, start_date, end_date):
+            with _segment(conn, database, year) as schema:
+                if year is not None:
+                    query, params = _search_query(text, start_date, end_date, schema)
+                cursor.execute(query + " LIMIT ? OFFSET ?", params + [limit + 1 - len(rows), skip])
+                rows.extend(cursor.fetchall())
+                if skip and not rows:
+                    cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
+                    skip = max(skip - cursor.fetchone()[0], 0)
+                else:
+                    skip = 0
+            if len(rows) > limit:
+                break
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = str(offset + limit)
+
+        metrics.QUERY_ROWS.observe(len(rows), function='search_transactions')
+        if columnar:
+            return _rows_to_columns(rows), next_cursor
+        return [_row_to_transaction(row) for row in rows], next_cursor
+
+    except Exception as e:
+        logger.error("Error searching transactions: %s", e)
+        raise
+    finally:
+        reader.release(conn)
 
 def get_recent_transactions(limit: int = 5) -> List[Dict]:
     """Get most recent transactions"""
-    conn = get_db()
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM transactions ORDER BY transaction_date DESC LIMIT ?",
-            (limit,)
-        )
-        rows = cursor.fetchall()
-        
-        # Convert rows to list of dicts (same format as get_transactions)
-        transactions = []
-        for row in rows:
-            transactions.append({
-                'transactionDate': row['transaction_date'],
-                'title': row['title'],
-                'journalList': [
-                    {
-                        'master': True,
-                        'entryType': row['entry_type'],
-                        'amount': row['amount'],
-                        'account': {'name': row['account_name']}
-                    },
-                    {
-                        'master': False,
-                        'entryType': 'DEBIT' if row['entry_type'] == 'CREDIT' else 'CREDIT',
-                        'amount': row['amount'],
-                        'account': {
-                            'name': row['category_name'],
-                            'type': row['category_type'],
-                            'icon': row['category_icon']
-                        }
-                    }
-                ]
-            })
-        
+        transactions, _ = get_transactions_page(limit=limit)
         return transactions
-        
-    except Exception as e:
-        logger.error(f"Error getting recent transactions: {str(e)}")
+    except Exception:
         return []
+
+@metrics.QUERY_SECONDS.time(function='get_summary')
+def get_summary(start_date: Optional[int] = None, end_date: Optional[int] = None,
+                group_by: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Aggregate transaction amounts in SQL instead of shipping every row to the client
+
+    Day-aligned ranges are answered from the rollup tables; anything else is
+    aggregated over the transactions table directly, and over the archive files
+    of the years the range reaches into.
+
+    Args:
+        start_date: Range start (timestamp in milliseconds)
+        end_date: Range end (timestamp in milliseconds)
+        group_by: Dimensions from SUMMARY_DIMENSIONS; at most one period
+
+    Returns:
+        List of aggregate rows with the grouped dimensions, total and count
+
+    Errors propagate so that callers caching the result never cache a failure.
+    """
+    group_by = list(dict.fromkeys(group_by or ['category', 'entry_type']))
+    period = _summary_period(group_by)
+
+    database = _database()
+    reader = database.reader
+    conn = reader.acquire()
+    try:
+        cursor = conn.cursor()
+        # Rollups cover archived years as well
+        segments = [None]
+        if _summary_source(start_date, end_date, period) is None:
+            segments = _segments(cursor, start_date, end_date)
+        rows = []
+        for year in segments:
+            with _segment(conn, database, year) as schema:
+                query, params = _summary_query(start_date, end_date, group_by, schema)
+                cursor.execute(query, params)
+                rows.extend(cursor.fetchall())
+        if len(segments) > 1:
+            rows = _merge_summary_rows(rows, group_by)
+        metrics.QUERY_ROWS.observe(len(rows), function='get_summary')
+        return [_summary_row_to_dict(row, group_by) for row in rows]
+
+    except Exception as e:
+        logger.error("Error getting summary: %s", e)
+        raise
     finally:
-        conn.close()
+        reader.release(conn)
+
+def _summary_period(group_by: List[str]) -> Optional[str]:
+    """Validate the requested summary dimensions and return the period among them, if any"""
+    unknown = [dimension for dimension in group_by if dimension not in SUMMARY_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown summary dimension(s): {', '.join(unknown)}")
+    periods = [dimension for dimension in group_by if dimension in PERIOD_FORMATS]
+    if len(periods) > 1:
+        raise ValueError("Only one of day, week, month or year can be used in a summary")
+    return periods[0] if periods else None
+
+def _summary_query(start_date: Optional[int], end_date: Optional[int],
+                   group_by: List[str], schema: str = 'main') -> Tuple[str, List]:
+    """
+    Build the aggregate query for get_summary, validating the requested dimensions
+
+    schema only matters when raw rows are aggregated: the hot table ('main') or
+    an attached archive, which has no covering index to pin.
+    """
+    period = _summary_period(group_by)
+    source = _summary_source(start_date, end_date, period)
+    if source:
+        table, where, params = source
+        period_expression = f"strftime('{PERIOD_FORMATS.get(period, '')}', {_rollup_day_expression(table)})"
+        total_expression, count_expression = 'SUM(total_minor)', 'SUM(count)'
+    else:
+        # Pinned: with ANALYZE stats the planner prefers a slower skip-scan of idx_category_date
+        table = 'main.transactions INDEXED BY idx_date_summary' if schema == 'main' else f'{schema}.transactions'
+        where, params = '', []
+        if start_date is not None and end_date is not None:
+            where = " WHERE transaction_date BETWEEN ? AND ?"
+            params = [start_date, end_date]
+        period_expression = f"strftime('{PERIOD_FORMATS.get(period, '')}', transaction_date / 1000, 'unixepoch', 'localtime')"
+        total_expression, count_expression = 'SUM(amount_minor)', 'COUNT(*)'
+
+    columns = [SUMMARY_DIMENSIONS[dimension] for dimension in group_by]
+    select_list = ', '.join(
+        f"{period_expression} AS period" if column == 'period' else column for column in columns
+    )
+    aggregate = (
+        f"SELECT {select_list}, {total_expression} AS total_minor, {count_expression} AS count"
+        f" FROM {table}{where} GROUP BY {', '.join(columns)}"
+    )
+
+    # Names are joined onto the few aggregate rows rather than onto every row aggregated
+    names, joins = ['s.*'], []
+    if 'category' in group_by:
+        names.append("c.name AS category_name, NULLIF(c.type, '') AS category_type, NULLIF(c.icon, '') AS category_icon")
+        joins.append(" JOIN categories c ON c.id = s.category_id")
+    if 'account' in group_by:
+        names.append("a.name AS account_name")
+        joins.append(" JOIN accounts a ON a.id = s.account_id")
+    query = f"SELECT {', '.join(names)} FROM ({aggregate}) s{''.join(joins)} ORDER BY s.total_minor DESC"
+    return query, params
+
+def _merge_summary_rows(rows: List[sqlite3.Row], group_by: List[str]) -> List[Dict]:
+    """Add up the aggregate rows of several segments that share their dimension values, largest total first"""
+    columns = [SUMMARY_DIMENSIONS[dimension] for dimension in group_by]
+    merged = {}
+    for row in rows:
+        key = tuple(row[column] for column in columns)
+        if key in merged:
+            merged[key]['total_minor'] += row['total_minor']
+            merged[key]['count'] += row['count']
+        else:
+            merged[key] = dict(zip(row.keys(), row))
+    return sorted(merged.values(), key=lambda row: row['total_minor'], reverse=True)
+
+def _rollup_day_expression(table: str) -> str:
+    """SQL date expression for a rollup period column that strftime can parse"""
+    return 'day' if table == 'daily_rollups' else "month || '-01'"
+
+def _summary_source(start_date: Optional[int], end_date: Optional[int],
+                    period: Optional[str]) -> Optional[Tuple[str, str, List]]:
+    """
+    Pick the rollup table able to answer a summary query
+
+    Returns (table, where clause, params), or None when the range doesn't fall on
+    local day boundaries and the transactions table has to be aggregated instead.
+    """
+    coarse_enough = period not in ('day', 'week')
+    if start_date is None or end_date is None:
+        table = 'monthly_rollups' if coarse_enough else 'daily_rollups'
+        return table, '', []
+
+    start = datetime.fromtimestamp(start_date / 1000)
+    end_exclusive = datetime.fromtimestamp((end_date + 1) / 1000)
+    midnight = dict(hour=0, minute=0, second=0, microsecond=0)
+    if start != start.replace(**midnight) or end_exclusive != end_exclusive.replace(**midnight):
+        return None
+
+    first_day, last_day = _local_day(start_date), _local_day(end_date)
+    if coarse_enough and start.day == 1 and end_exclusive.day == 1:
+        return 'monthly_rollups', ' WHERE month BETWEEN ? AND ?', [first_day[:7], last_day[:7]]
+    return 'daily_rollups', ' WHERE day BETWEEN ? AND ?', [first_day, last_day]
 
-# Initialize database when module is imported
-init_db() 
\ No newline at end of file
+def _summary_row_to_dict(row: sqlite3.Row, group_by: List[str]) -> Dict:
+    """Shape an aggregate row like the camelCase objects the API already returns"""
+    summary = {}
+    for dimension in group_by:
+        if dimension == 'category':
+            summary['category'] = {
+                'name': row['category_name'],
+                'type': row['category_type'],
+                'icon': row['category_icon']
+            }
+        elif dimension == 'account':
+            summary['account'] = row['account_name']
+        elif dimension == 'entry_type':
+            summary['entryType'] = ENTRY_TYPES[row['entry_type']]
+        else:
+            summary['period'] = row['period']
+    summary['total'] = round(row['total_minor'] / MINOR_UNITS, 2)
+    summary['count'] = row['count']
+    return summary
+ 
\ No newline at end of file
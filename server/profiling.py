@@ -0,0 +1,161 @@
+"""
+On-demand profiling of single API requests
+
+Off unless SALDO_PROFILE_TOKEN is set. When it is, a request that asks for a
+profile (?profile=1 or an "X-Profile: 1" header) and carries the token in
+X-Profile-Token runs its handler under cProfile. The profile is saved as a
+pstats file under PROFILE_DIR, which keeps only the newest PROFILE_KEEP files.
+The response says where to find it:
+
+    X-Profile-Id: 20250127T101500-api-summary-3f2a1b9c
+    X-Profile-Top: execute=11.8ms, _summary_row_to_dict=0.9ms, ...
+
+X-Profile-Top lists the functions with the most time spent in their own code.
+/api/profile?id=<X-Profile-Id> (same token; &sort=own for own time) returns the
+top functions by cumulative time as JSON. Saved files open with `python -m pstats <file>` or snakeviz.
+
+With profiling off, handlers are registered unwrapped, so requests pay nothing.
+Streamed responses are profiled up to their first byte only. One request is
+profiled at a time (Python 3.12+ allows a single active profiler per process);
+a request asking for a profile while another is being taken is served
+unprofiled, with "X-Profile-Skipped: busy".
+"""
+
+import os
+import re
+import hmac
+import uuid
+import pstats
+import logging
+import tempfile
+import cProfile
+import threading
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, List
+
+from server.api import ApiRequest, ApiResponse, error_response, json_response
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.environ.get('SALDO_PROFILE_TOKEN')
+ENABLED = bool(PROFILE_TOKEN)
+
+PROFILE_DIR = os.environ.get('SALDO_PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'saldo-profiles')
+PROFILE_KEEP = 50       # Newest profiles kept on disk
+TOP_FUNCTIONS = 20      # Functions listed by /api/profile
+HEADER_FUNCTIONS = 5    # Functions listed in the X-Profile-Top header
+
+PROFILE_ID = re.compile(r'^[\w-]+$')
+
+# Held while a request runs under cProfile
+profile_lock = threading.Lock()
+
+def authorized(request: ApiRequest) -> bool:
+    token = request.headers.get('X-Profile-Token', '')
+    return hmac.compare_digest(token.encode('utf-8'), PROFILE_TOKEN.encode('utf-8'))
+
+def requested(request: ApiRequest) -> bool:
+    """Whether an authorized client asked for this request to be profiled"""
+    if request.args.get('profile') != '1' and request.headers.get('X-Profile') != '1':
+        return False
+    return authorized(request)
+
+def top_functions(stats: pstats.Stats, limit: int, key: str = 'cumulativeMs') -> List[Dict]:
+    """Functions with the most time by key ('cumulativeMs' or 'ownMs'), heaviest first"""
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': name,
+            'location': f"{os.path.basename(filename)}:{line}",
+            'calls': calls,
+            'ownMs': round(own * 1000, 3),
+            'cumulativeMs': round(cumulative * 1000, 3)
+        })
+    rows.sort(key=lambda row: row[key], reverse=True)
+    return rows[:limit]
+
+def save(profile: cProfile.Profile, route: str) -> str:
+    """Write a profile to PROFILE_DIR, drop the oldest ones beyond PROFILE_KEEP and return its id"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'\W+', '-', route).strip('-')
+    profile_id = f"{datetime.now():%Y%m%dT%H%M%S}-{slug}-{uuid.uuid4().hex[:8]}"
+    profile.dump_stats(os.path.join(PROFILE_DIR, profile_id + '.prof'))
+
+    saved = sorted((entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith('.prof')),
+                   key=lambda entry: entry.stat().st_mtime)
+    for entry in saved[:-PROFILE_KEEP]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass  # Already removed by a concurrent request
+    return profile_id
+
+def profiled(route: str, handler: Callable[[ApiRequest], ApiResponse]) -> Callable[[ApiRequest], ApiResponse]:
+    """Run the handler under cProfile when the request asks for it"""
+    @wraps(handler)
+    def wrapper(request: ApiRequest) -> ApiResponse:
+        if not requested(request):
+            return handler(request)
+
+        if not profile_lock.acquire(blocking=False):
+            response = handler(request)
+            response.headers['X-Profile-Skipped'] = 'busy'
+            return response
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiler outside this module is active
+                logger.warning("Not profiling %s: %s", route, e)
+                response = handler(request)
+                response.headers['X-Profile-Skipped'] = 'busy'
+                return response
+            try:
+                response = handler(request)
+            finally:
+                profile.disable()
+        finally:
+            profile_lock.release()
+
+        try:
+            profile_id = save(profile, route)
+            top = top_functions(pstats.Stats(profile), HEADER_FUNCTIONS, 'ownMs')
+            response.headers['X-Profile-Id'] = profile_id
+            response.headers['X-Profile-Top'] = ', '.join(f"{row['function']}={row['ownMs']}ms" for row in top)
+            logger.info("Saved profile %s for %s", profile_id, route)
+        except Exception as e:
+            # The response itself is fine; only the profile is lost
+            logger.error("Error saving profile for %s: %s", route, e)
+        return response
+    return wrapper
+
+def profile_page(request: ApiRequest) -> ApiResponse:
+    """Top functions of a saved profile, for clients that can't read the .prof file"""
+    if not authorized(request):
+        return error_response('Forbidden', 403)
+
+    profile_id = request.args.get('id', '')
+    path = os.path.join(PROFILE_DIR, profile_id + '.prof')
+    if not PROFILE_ID.match(profile_id) or not os.path.isfile(path):
+        return error_response('Profile not found', 404)
+
+    key = 'ownMs' if request.args.get('sort') == 'own' else 'cumulativeMs'
+    stats = pstats.Stats(path)
+    return json_response({
+        'status': 'success',
+        'data': {
+            'id': profile_id,
+            'totalMs': round(stats.total_tt * 1000, 3),
+            'functions': top_functions(stats, request.args.get('limit', TOP_FUNCTIONS, type=int), key)
+        }
+    })
+
+def with_profiling(routes: Dict[str, Callable]) -> Dict[str, Callable]:
+    """The API routes, wrapped for profiling and joined by /api/profile when profiling is enabled"""
+    if not ENABLED:
+        return routes
+    profiled_routes = {path: profiled(path, handler) for path, handler in routes.items()}
+    profiled_routes['/api/profile'] = profile_page
+    return profiled_routes